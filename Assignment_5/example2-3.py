@@ -3,9 +3,9 @@ from mcp.server.fastmcp import FastMCP, Image
 from mcp.server.fastmcp.prompts import base
 from mcp.types import TextContent
 from mcp import types
-from PIL import Image as PILImage
 import math
 import sys
+import json
 from pywinauto.application import Application
 import win32gui
 import win32con
@@ -13,6 +13,10 @@ import time
 from win32api import GetSystemMetrics
 from pywinauto import mouse, keyboard
 from dotenv import load_dotenv
+from tool_cache import ToolResultCache
+import numeric
+from offload import ProcessOffloader
+import imaging
 ##########
 import time
 from pywinauto.application import Application
@@ -30,142 +34,145 @@ load_dotenv()
 # instantiate an MCP server client
 mcp = FastMCP("Calculator")
 
+# Results of pure tools (output depends only on the arguments), shared by all sessions
+TOOL_CACHE_SIZE = 1024
+tool_cache = ToolResultCache(maxsize=TOOL_CACHE_SIZE)
+
+# CPU-bound tools (factorial, power, create_thumbnail) run in worker processes
+CPU_TOOL_WORKERS = os.cpu_count() or 1
+CPU_TOOL_TIMEOUT = 30  # seconds per call
+cpu_pool = ProcessOffloader(max_workers=CPU_TOOL_WORKERS, timeout=CPU_TOOL_TIMEOUT)
+
 # DEFINE TOOLS
 
 #addition tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def add(a: int, b: int) -> int:
     """Add two numbers"""
     print("CALLED: add(a: int, b: int) -> int:")
     return int(a + b)
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def add_list(l: list) -> int:
     """Add all numbers in a list"""
     print("CALLED: add(l: list) -> int:")
     return sum(l)
 
 # subtraction tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def subtract(a: int, b: int) -> int:
     """Subtract two numbers"""
     print("CALLED: subtract(a: int, b: int) -> int:")
     return int(a - b)
 
 # multiplication tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def multiply(a: int, b: int) -> int:
     """Multiply two numbers"""
     print("CALLED: multiply(a: int, b: int) -> int:")
     return int(a * b)
 
 #  division tool
-@mcp.tool() 
+@tool_cache.tool(mcp)
 def divide(a: int, b: int) -> float:
     """Divide two numbers"""
     print("CALLED: divide(a: int, b: int) -> float:")
     return float(a / b)
 
 # power tool
-@mcp.tool()
-def power(a: int, b: int) -> int:
+@tool_cache.tool(mcp)
+async def power(a: int, b: int) -> int:
     """Power of two numbers"""
     print("CALLED: power(a: int, b: int) -> int:")
-    return int(a ** b)
+    return await cpu_pool.run(numeric.power, a, b)
 
 # square root tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def sqrt(a: int) -> float:
     """Square root of a number"""
     print("CALLED: sqrt(a: int) -> float:")
     return float(a ** 0.5)
 
 # cube root tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def cbrt(a: int) -> float:
     """Cube root of a number"""
     print("CALLED: cbrt(a: int) -> float:")
     return float(a ** (1/3))
 
 # factorial tool
-@mcp.tool()
-def factorial(a: int) -> int:
+@tool_cache.tool(mcp)
+async def factorial(a: int) -> int:
     """factorial of a number"""
     print("CALLED: factorial(a: int) -> int:")
-    return int(math.factorial(a))
+    return int(await cpu_pool.run(numeric.factorial, a))
 
 # log tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def log(a: int) -> float:
     """log of a number"""
     print("CALLED: log(a: int) -> float:")
     return float(math.log(a))
 
 # remainder tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def remainder(a: int, b: int) -> int:
     """remainder of two numbers divison"""
     print("CALLED: remainder(a: int, b: int) -> int:")
     return int(a % b)
 
 # sin tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def sin(a: int) -> float:
     """sin of a number"""
     print("CALLED: sin(a: int) -> float:")
     return float(math.sin(a))
 
 # cos tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def cos(a: int) -> float:
     """cos of a number"""
     print("CALLED: cos(a: int) -> float:")
     return float(math.cos(a))
 
 # tan tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def tan(a: int) -> float:
     """tan of a number"""
     print("CALLED: tan(a: int) -> float:")
     return float(math.tan(a))
 
 # mine tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def mine(a: int, b: int) -> int:
     """special mining tool"""
     print("CALLED: mine(a: int, b: int) -> int:")
     return int(a - b - b)
 
 @mcp.tool()
-def create_thumbnail(image_path: str) -> Image:
+async def create_thumbnail(image_path: str) -> Image:
     """Create a thumbnail from an image"""
     print("CALLED: create_thumbnail(image_path: str) -> Image:")
-    img = PILImage.open(image_path)
-    img.thumbnail((100, 100))
-    return Image(data=img.tobytes(), format="png")
+    data = await cpu_pool.run(imaging.thumbnail_bytes, image_path)
+    return Image(data=data, format="png")
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def strings_to_chars_to_int(string: str) -> list[int]:
     """Return the ASCII values of the characters in a word"""
     print("CALLED: strings_to_chars_to_int(string: str) -> list[int]:")
     return [int(ord(char)) for char in string]
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def int_list_to_exponential_sum(int_list: list) -> float:
     """Return sum of exponentials of numbers in a list"""
     print("CALLED: int_list_to_exponential_sum(int_list: list) -> float:")
-    return sum(math.exp(i) for i in int_list)
+    return numeric.exp_sum(int_list)
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def fibonacci_numbers(n: int) -> list:
     """Return the first n Fibonacci Numbers"""
     print("CALLED: fibonacci_numbers(n: int) -> list:")
-    if n <= 0:
-        return []
-    fib_sequence = [0, 1]
-    for _ in range(2, n):
-        fib_sequence.append(fib_sequence[-1] + fib_sequence[-2])
-    return fib_sequence[:n]
+    return numeric.fibonacci_numbers(n)
 
 
 @mcp.tool()
@@ -393,6 +400,19 @@ def get_greeting(name: str) -> str:
     return f"Hello, {name}!"
 
 
+# Hit statistics of the pure tool result cache
+@mcp.resource("stats://tool_cache")
+def get_tool_cache_stats() -> str:
+    """Size and hit/miss counts of the tool result cache"""
+    return json.dumps(tool_cache.stats(), indent=2)
+
+# Process pool usage of the CPU-bound tools
+@mcp.resource("stats://process_pool")
+def get_process_pool_stats() -> str:
+    """Calls, timeouts, cancellations and restarts of the CPU tool process pool"""
+    return json.dumps(cpu_pool.stats(), indent=2)
+
+
 # DEFINE AVAILABLE PROMPTS
 @mcp.prompt()
 def review_code(code: str) -> str:
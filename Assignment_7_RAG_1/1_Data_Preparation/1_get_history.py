@@ -8,7 +8,9 @@ Data Preparation Script
 
 2. scrape_links_content(history_json_path):
    - Loads links from the JSON file.
-   - Visits each link, scrapes the main content (text), and saves both links and contents to a new JSON file.
+   - Fetches the links concurrently over a pooled async HTTP client, with a per-host concurrency limit.
+   - Sends ETag/Last-Modified validators from the previous run and reuses the cached content on 304.
+   - Scrapes the main content (text) and streams each {link, content} record to the output JSON file as it finishes.
 
 Note: Requires Chrome to be installed and accessible. Scraping may be limited by robots.txt or site protections.
 """
@@ -17,10 +19,27 @@ import json
 import sqlite3
 import datetime
 import re
-import requests
+import asyncio
+from urllib.parse import urlsplit
+import httpx
 from bs4 import BeautifulSoup
 from typing import List
 
+# Use the faster lxml parser when it is installed
+try:
+    import lxml  # noqa: F401
+
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# -- SCRAPER CONFIG --
+MAX_CONNECTIONS = 32  # total concurrent requests
+MAX_PER_HOST = 4  # concurrent requests to a single host
+REQUEST_TIMEOUT = 10
+MAX_CONTENT_CHARS = 10_000
+VALIDATOR_CACHE = os.path.join("data", "scrape_cache.json")
+
 def get_browsing_history(n_days: int, output_json: str = os.path.join("data", "browsing_history.json")) -> List[str]:
     """
     Fetch Chrome browsing history for the last n_days, filter out personal/social links, and save to JSON.
@@ -82,26 +101,101 @@ def get_browsing_history(n_days: int, output_json: str = os.path.join("data", "b
     print(f"Saved {len(links)} links to {output_json}")
     return links
 
-def scrape_links_content(history_json_path: str, output_json: str = os.path.join("data", "scraped_contents.json")):
+def extract_text(html: str) -> str:
+    """Return the visible text of an HTML page, limited to MAX_CONTENT_CHARS."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    # Get visible text only
+    return " ".join(soup.stripped_strings)[:MAX_CONTENT_CHARS]
+
+def load_validator_cache(path: str = VALIDATOR_CACHE) -> dict:
+    """Load {url: {etag, last_modified, content}} saved by the previous scrape."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+async def fetch_content(client: httpx.AsyncClient, url: str, host_limits: dict, cache: dict) -> str:
     """
-    Loads links from JSON, scrapes each, and saves a list of {link, content} dicts to output_json.
+    Fetch one URL and return its text content.
+    Sends conditional request headers when the URL was seen before and reuses the cached
+    content on 304 Not Modified.
     """
-    with open(history_json_path, "r", encoding="utf-8") as f:
-        links = json.load(f)
-    results = []
-    for url in links:
+    host = urlsplit(url).netloc
+    if host not in host_limits:
+        host_limits[host] = asyncio.Semaphore(MAX_PER_HOST)
+    semaphore = host_limits[host]
+    cached = cache.get(url)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    async with semaphore:
+        resp = await client.get(url, headers=headers)
+
+    if resp.status_code == 304 and cached:
+        return cached["content"]
+
+    # Parse in a worker thread so the event loop keeps serving other downloads
+    content = await asyncio.to_thread(extract_text, resp.text)
+    if resp.status_code == 200:
+        cache[url] = {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content": content,
+        }
+    return content
+
+async def scrape_links_content_async(links: List[str], output_json: str, cache_path: str = VALIDATOR_CACHE) -> int:
+    """
+    Scrape links concurrently and stream {link, content} records to output_json in link order,
+    each one as soon as it and every earlier link have finished.
+    The file is a JSON list once the scrape completes. Returns the number of records written.
+    """
+    cache = load_validator_cache(cache_path)
+    host_limits = {}
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+    written = 0
+
+    async def scrape(client, i, url):
         try:
-            resp = requests.get(url, timeout=10)
-            soup = BeautifulSoup(resp.text, "html.parser")
-            # Get visible text only
-            texts = soup.stripped_strings
-            content = " ".join(texts)[:10_000]  # Limit to 10k chars
+            content = await fetch_content(client, url, host_limits, cache)
         except Exception as e:
             content = f"[Error scraping: {e}]"
-        results.append({"link": url, "content": content})
-    with open(output_json, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2)
-    print(f"Saved scraped contents for {len(results)} links to {output_json}")
+        return i, {"link": url, "content": content}
+
+    with open(output_json, "w", encoding="utf-8") as out:
+        out.write("[\n")
+        async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, follow_redirects=True) as client:
+            tasks = [asyncio.create_task(scrape(client, i, url)) for i, url in enumerate(links)]
+            # Records that finished ahead of an earlier link wait here until it is written
+            finished = {}
+            for task in asyncio.as_completed(tasks):
+                i, record = await task
+                finished[i] = record
+                while written in finished:
+                    if written:
+                        out.write(",\n")
+                    out.write(json.dumps(finished.pop(written), indent=2))
+                    written += 1
+                out.flush()
+        out.write("\n]")
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    return written
+
+def scrape_links_content(history_json_path: str, output_json: str = os.path.join("data", "scraped_contents.json")):
+    """
+    Loads links from JSON, scrapes them concurrently, and saves a list of {link, content} dicts to output_json.
+    """
+    with open(history_json_path, "r", encoding="utf-8") as f:
+        links = json.load(f)
+    count = asyncio.run(scrape_links_content_async(links, output_json))
+    print(f"Saved scraped contents for {count} links to {output_json}")
 
 if __name__ == "__main__":
     n = int(input("Enter number of days to fetch browsing history: "))
@@ -3,9 +3,10 @@
 - Steps performed:
     - Loads scraped_contents.json (list of {link, content} dicts).
     - Chunks each content into overlapping segments.
-    - Gets embeddings for each chunk using Ollama's local API.
+    - Gets embeddings for batches of chunks using Ollama's local /api/embed API,
+      with several batch requests in flight over a pooled HTTP session.
     - Stores chunk metadata (URL, chunk text, chunk id).
-    - Creates a FAISS index and adds all chunk embeddings.
+    - Adds each batch of embeddings to the FAISS index as soon as it arrives.
     - Saves the index and metadata for later retrieval.
 - Useful for semantic search over web browsing content with chunk-level granularity.
 """
@@ -16,6 +17,10 @@ import numpy as np
 import requests
 import json
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from requests.adapters import HTTPAdapter
 
 # -- CONFIG --
 CHUNK_SIZE = 40
@@ -23,6 +28,12 @@ CHUNK_OVERLAP = 10
 INPUT_JSON = os.path.join("data", "scraped_contents.json")
 INDEX_PATH = os.path.join("data", "faiss_web_index.bin")
 META_PATH = os.path.join("data", "faiss_web_metadata.json")
+OLLAMA_URL = "http://localhost:11434"
+EMBED_MODEL = "nomic-embed-text"
+BATCH_SIZE = 64  # chunks per embedding request
+MAX_IN_FLIGHT = 4  # concurrent embedding requests
+MAX_RETRIES = 2
+RETRY_BACKOFF = 1.0  # seconds before the first retry, doubled for each further one
 
 # -- HELPERS --
 def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
@@ -34,57 +45,99 @@ def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
             chunks.append(chunk)
     return chunks
 
-def get_embedding(text: str) -> np.ndarray:
-    response = requests.post(
-        "http://localhost:11434/api/embeddings",
-        json={
-            "model": "nomic-embed-text",
-            "prompt": text
-        }
-    )
-    response.raise_for_status()
-    return np.array(response.json()["embedding"], dtype=np.float32)
+def make_session(pool_size=MAX_IN_FLIGHT) -> requests.Session:
+    """Create an HTTP session whose connection pool covers all in-flight requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-def build_index():
+def get_embeddings(texts: list, session=requests) -> np.ndarray:
     """
-    Build FAISS index from scraped content.
+    Embed many texts with a single multi-input request to Ollama's /api/embed.
+    Returns a (len(texts), dim) float32 matrix.
     """
-    all_chunks = []
-    metadata = []
-
-    with open(INPUT_JSON, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = session.post(
+                f"{OLLAMA_URL}/api/embed",
+                json={"model": EMBED_MODEL, "input": texts},
+                timeout=300,
+            )
+            response.raise_for_status()
+            return np.array(response.json()["embeddings"], dtype=np.float32)
+        except Exception:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
 
-    for entry_idx, entry in enumerate(data[:30]):
+def iter_chunks(data):
+    """Yield (chunk, metadata) for every chunk of every page, in page order."""
+    for entry_idx, entry in enumerate(data):
         url = entry["link"]
-        content = entry["content"]
-        chunks = chunk_text(content)
+        chunks = chunk_text(entry["content"])
         for idx, chunk in enumerate(chunks):
-            try:
-                emb = get_embedding(chunk)
-                all_chunks.append(emb)
-                metadata.append({
-                    "url": url,
-                    "chunk": chunk,
-                    "chunk_id": f"entry{entry_idx}_chunk{idx}"
-                })
-            except Exception as e:
-                print(f"Error embedding chunk from {url}: {e}")
-        print(f"Processed {len(chunks)} chunks from {url}")
-        time.sleep(0.5)  # Small delay to avoid overwhelming Ollama
+            yield chunk, {
+                "url": url,
+                "chunk": chunk,
+                "chunk_id": f"entry{entry_idx}_chunk{idx}"
+            }
+        print(f"Queued {len(chunks)} chunks from {url}")
 
-    # -- CREATE FAISS INDEX --
-    if not all_chunks:
-        raise ValueError("No chunks to index!")
-    dimension = len(all_chunks[0])
-    index = faiss.IndexFlatL2(dimension)
-    index.add(np.stack(all_chunks))
+def iter_batches(items, size=BATCH_SIZE):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+def build_index(input_json=INPUT_JSON, limit=None, batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Build FAISS index from scraped content.
+
+    Chunks are embedded in batches of batch_size, with up to max_in_flight
+    requests running at once over a pooled HTTP session. Finished batches are
+    added to the FAISS index in order as they arrive.
+    """
+    with open(input_json, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if limit is not None:
+        data = data[:limit]
+
+    index = None
+    metadata = []
+    session = make_session(max_in_flight)
+    in_flight = deque()
+
+    def add_batch(batch, future):
+        nonlocal index
+        try:
+            vectors = future.result()
+        except Exception as e:
+            print(f"Error embedding batch of {len(batch)} chunks from {batch[0][1]['url']}: {e}")
+            return
+        if index is None:
+            index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        metadata.extend(meta for _, meta in batch)
+        print(f"Indexed {index.ntotal} chunks")
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for batch in iter_batches(iter_chunks(data), batch_size):
+            # Bound the number of requests in flight; drain the oldest first to keep order
+            if len(in_flight) >= max_in_flight:
+                add_batch(*in_flight.popleft())
+            future = pool.submit(get_embeddings, [chunk for chunk, _ in batch], session)
+            in_flight.append((batch, future))
+        while in_flight:
+            add_batch(*in_flight.popleft())
 
     # -- SAVE INDEX & METADATA --
+    if index is None or index.ntotal == 0:
+        raise ValueError("No chunks to index!")
     faiss.write_index(index, INDEX_PATH)
     with open(META_PATH, "w", encoding="utf-8") as f:
         json.dump(metadata, f, indent=2)
-    print(f"✅ Indexed {len(all_chunks)} chunks from {len(data)} web pages. Index saved to {INDEX_PATH}, metadata to {META_PATH}.")
+    print(f"✅ Indexed {index.ntotal} chunks from {len(data)} web pages. Index saved to {INDEX_PATH}, metadata to {META_PATH}.")
 
 if __name__ == "__main__":
     build_index() 
\ No newline at end of file
@@ -7,13 +7,16 @@
     - Stores chunk metadata (URL, chunk text, chunk id) in LangChain Document objects.
     - Creates a FAISS index and adds all chunk embeddings.
     - Saves the index and metadata using LangChain's FAISS.save_local().
+- Re-runs are incremental: each page is fingerprinted by a hash of its content and
+  given a stable id derived from its URL. Only new or changed pages are embedded;
+  the vectors of changed or removed pages are deleted from the index.
 - Useful for semantic search over web browsing content with chunk-level granularity.
 """
 
 import os
 import openai
 import json
-import time
+import hashlib
 from dotenv import load_dotenv
 import numpy as np
 from langchain_community.vectorstores import FAISS
@@ -25,6 +28,7 @@ CHUNK_SIZE = 40
 CHUNK_OVERLAP = 10
 INPUT_JSON = os.path.join("data", "scraped_contents.json")
 INDEX_DIR = os.path.join("data", "faiss_web_index_openai_lc")
+PAGES_FILE = "pages.json"  # {url: {"hash": content hash, "chunk_ids": [...]}} stored in INDEX_DIR
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -39,9 +43,52 @@ def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
             chunks.append(chunk)
     return chunks
 
-def build_index(use_browser_content=False):
+def page_id(url: str) -> str:
+    """Stable id for a page, derived from its URL."""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def page_documents(url: str, content: str):
+    """Chunk a page into Documents with stable chunk ids. Returns (ids, docs)."""
+    pid = page_id(url)
+    ids = []
+    docs = []
+    for idx, chunk in enumerate(chunk_text(content)):
+        chunk_id = f"{pid}_chunk{idx}"
+        ids.append(chunk_id)
+        docs.append(Document(
+            page_content=chunk,
+            metadata={
+                "url": url,
+                "chunk_id": chunk_id
+            }
+        ))
+    return ids, docs
+
+def load_pages(index_dir: str) -> dict:
+    path = os.path.join(index_dir, PAGES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_pages(index_dir: str, pages: dict):
+    path = os.path.join(index_dir, PAGES_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pages, f, indent=2)
+    os.replace(tmp_path, path)
+
+def build_index(use_browser_content=False, index_dir=INDEX_DIR, full_rebuild=False, prune_missing=True):
     """
-    Build FAISS index from scraped content using OpenAI embeddings and save with LangChain.
+    Build or incrementally update the FAISS index from scraped content using OpenAI embeddings
+    and save with LangChain.
+
+    Pages whose content hash is unchanged since the last run are skipped. Changed pages have
+    their old vectors deleted and are re-embedded; pages no longer in the input are deleted
+    when prune_missing is set. Without a pages.json from a previous run the index is rebuilt.
     """
     if use_browser_content:
         input_json = os.path.join("data", "scraped_contents.json")
@@ -50,29 +97,67 @@ def build_index(use_browser_content=False):
 
     with open(input_json, "r", encoding="utf-8") as f:
         data = json.load(f)
+    # Last occurrence of a URL wins
+    current = {entry["link"]: entry["content"] for entry in data}
 
-    docs = []
-    for entry_idx, entry in enumerate(data):
-        url = entry["link"]
-        content = entry["content"]
-        chunks = chunk_text(content)
-        for idx, chunk in enumerate(chunks):
-            doc = Document(
-                page_content=chunk,
-                metadata={
-                    "url": url,
-                    "chunk_id": f"entry{entry_idx}_chunk{idx}"
-                }
-            )
-            docs.append(doc)
-        print(f"Processed {len(chunks)} chunks from {url}")
-        time.sleep(0.5)  # Small delay to avoid overwhelming OpenAI API
-
-    # -- CREATE FAISS INDEX WITH LANGCHAIN --
     embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    vector_store = FAISS.from_documents(docs, embeddings)
-    vector_store.save_local(INDEX_DIR)
-    print(f"✅ Indexed {len(docs)} chunks from {len(data)} web pages. Index saved to {INDEX_DIR} (index.faiss, index.pkl)")
+    pages = {} if full_rebuild else load_pages(index_dir)
+    vector_store = None
+    if pages and os.path.exists(os.path.join(index_dir, "index.faiss")):
+        vector_store = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    else:
+        pages = {}
+
+    # -- WORK OUT WHAT CHANGED --
+    stale_ids = []
+    new_ids = []
+    new_docs = []
+    unchanged = 0
+    for url, content in current.items():
+        fingerprint = content_hash(content)
+        previous = pages.get(url)
+        if previous and previous["hash"] == fingerprint:
+            unchanged += 1
+            continue
+        if previous:
+            stale_ids.extend(previous["chunk_ids"])
+        ids, docs = page_documents(url, content)
+        new_ids.extend(ids)
+        new_docs.extend(docs)
+        pages[url] = {"hash": fingerprint, "chunk_ids": ids}
+        print(f"{'Changed' if previous else 'New'} page: {len(docs)} chunks from {url}")
+
+    removed = [url for url in pages if url not in current] if prune_missing else []
+    for url in removed:
+        stale_ids.extend(pages.pop(url)["chunk_ids"])
+        print(f"Removed page: {url}")
+
+    # -- APPLY CHANGES TO THE FAISS INDEX --
+    # pages.json is written after the index, so after a crash between the two it can
+    # lag behind: stale ids may already be gone and new ids already present. Delete
+    # only ids the index has, including new ids that are about to be re-added.
+    deleted = 0
+    if vector_store is not None:
+        existing = set(vector_store.index_to_docstore_id.values())
+        to_delete = [i for i in dict.fromkeys(stale_ids + new_ids) if i in existing]
+        if to_delete:
+            vector_store.delete(ids=to_delete)
+        deleted = len(to_delete)
+    if new_docs:
+        if vector_store is None:
+            vector_store = FAISS.from_documents(new_docs, embeddings, ids=new_ids)
+        else:
+            vector_store.add_documents(new_docs, ids=new_ids)
+    if vector_store is None:
+        print("No pages to index.")
+        return
+
+    vector_store.save_local(index_dir)
+    save_pages(index_dir, pages)
+    print(
+        f"✅ Indexed {len(new_docs)} new chunks, deleted {deleted} old chunks, "
+        f"skipped {unchanged} unchanged pages. Index saved to {index_dir} (index.faiss, index.pkl, {PAGES_FILE})"
+    )
 
 if __name__ == "__main__":
     build_index() 
\ No newline at end of file
@@ -20,15 +20,16 @@ INDEX_PATH = os.path.join("data", "faiss_web_index.bin")
 META_PATH = os.path.join("data", "faiss_web_metadata.json")
 
 def get_embedding(text: str) -> np.ndarray:
+    # Same endpoint as the index build, which returns normalized embeddings
     response = requests.post(
-        "http://localhost:11434/api/embeddings",
+        "http://localhost:11434/api/embed",
         json={
             "model": "nomic-embed-text",
-            "prompt": text
+            "input": text
         }
     )
     response.raise_for_status()
-    return np.array(response.json()["embedding"], dtype=np.float32)
+    return np.array(response.json()["embeddings"][0], dtype=np.float32)
 
 def search_and_open(query: str, index_path=INDEX_PATH, meta_path=META_PATH):
     """
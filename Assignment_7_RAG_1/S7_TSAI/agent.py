@@ -2,10 +2,12 @@ import asyncio
 import time
 import os
 import datetime
-from perception import extract_perception
+import json
+from perception import extract_perception, PerceptionCache
 from memory import MemoryManager, MemoryItem
-from decision import generate_plan
-from action import execute_tool
+from decision import generate_plan, perceive_and_plan
+from action import execute_tool, parse_function_call, ToolCallResult
+from tracing import tracer
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
  # use this to connect to running server
@@ -19,7 +21,42 @@ def log(stage: str, msg: str):
 
 max_steps = 3
 
+# Memory snapshot shared by agent runs, so earlier tool results are not recomputed
+MEMORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_store")
+# Server resource listing the tools declared pure; only these are answered from memory
+PURE_TOOLS_RESOURCE = "stats://tool_cache"
+# Perception only feeds the plan, so extract both in one LLM call per step
+MERGE_PERCEPTION_AND_PLAN = True
+# With separate perception and plan calls, perception is extracted once and
+# reused by later steps (PerceptionCache); the merged path has no call to save.
+# Steps that may reuse a perception before it is extracted again (None = no limit)
+PERCEPTION_MAX_REUSE = None
+# Span traces of each run are written here as <run>.json and <run>.chrome.json
+TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces")
+
+
+async def get_pure_tools(session: ClientSession) -> set:
+    """Names of the tools the server declares pure, or an empty set if it does not say."""
+    try:
+        resource = await session.read_resource(PURE_TOOLS_RESOURCE)
+        return set(json.loads(resource.contents[0].text).get("pure_tools", []))
+    except Exception as e:
+        log("memory", f"No pure tool list from the server, stored results will not be reused: {e}")
+        return set()
+
+
+def export_trace(run_id: str):
+    """Write the run's spans as JSON and Chrome trace files and log the per-stage totals."""
+    tracer.to_json(os.path.join(TRACE_DIR, f"{run_id}.json"))
+    tracer.to_chrome_trace(os.path.join(TRACE_DIR, f"{run_id}.chrome.json"))
+    for name, stats in tracer.summary().items():
+        counters = ", ".join(f"{k}={int(v)}" for k, v in stats["counters"].items())
+        log("trace", f"{name}: {stats['count']}x, total {stats['total_ms']:.0f} ms, "
+                     f"max {stats['max_ms']:.0f} ms{', ' + counters if counters else ''}")
+
 async def main(user_input: str):
+    tracer.reset()
+    run_id = f"run-{int(time.time())}"
     try:
         print("[agent] Starting agent...")
         print(f"[agent] Current working directory: {os.getcwd()}")
@@ -55,48 +92,96 @@ async def main(user_input: str):
                             )
 
                             log("agent", f"{len(tools)} tools loaded")
+                            reusable_tools = await get_pure_tools(session)
 
-                            memory = MemoryManager()
+                            with tracer.span("memory.load"):
+                                memory = MemoryManager.load(MEMORY_DIR)
+                            log("memory", f"Loaded {len(memory.data)} memories from {MEMORY_DIR}")
                             session_id = f"session-{int(time.time())}"
                             query = user_input  # Store original intent
+                            perception_cache = PerceptionCache(query, max_reuse=PERCEPTION_MAX_REUSE)
                             step = 0
 
                             while step < max_steps:
-                                log("loop", f"Step {step + 1} started")
-
-                                perception = extract_perception(user_input)
-                                log("perception", f"Intent: {perception.intent}, Tool hint: {perception.tool_hint}")
-
-                                retrieved = memory.retrieve(query=user_input, top_k=3, session_filter=session_id)
-                                log("memory", f"Retrieved {len(retrieved)} relevant memories")
-
-                                plan = generate_plan(perception, retrieved, tool_descriptions=tool_descriptions)
-                                log("plan", f"Plan generated: {plan}")
-
-                                if plan.startswith("FINAL_ANSWER:"):
-                                    log("agent", f"✅ FINAL RESULT: {plan}")
-                                    break
-
-                                try:
-                                    result = await execute_tool(session, tools, plan)
-                                    log("tool", f"{result.tool_name} returned: {result.result}")
-
-                                    memory.add(MemoryItem(
-                                        text=f"Tool call: {result.tool_name} with {result.arguments}, got: {result.result}",
-                                        type="tool_output",
-                                        tool_name=result.tool_name,
-                                        user_query=user_input,
-                                        tags=[result.tool_name],
-                                        session_id=session_id
-                                    ))
-
-                                    user_input = f"Original task: {query}\nPrevious output: {result.result}\nWhat should I do next?"
-
-                                except Exception as e:
-                                    log("error", f"Tool execution failed: {e}")
-                                    break
+                                with tracer.span("step", step=step + 1):
+                                    log("loop", f"Step {step + 1} started")
+
+                                    with tracer.span("memory.retrieve"):
+                                        retrieved = memory.retrieve(query=user_input, top_k=3, session_filter=session_id)
+                                    log("memory", f"Retrieved {len(retrieved)} relevant memories")
+
+                                    if MERGE_PERCEPTION_AND_PLAN:
+                                        with tracer.span("perceive_and_plan"):
+                                            perception, plan = await perceive_and_plan(
+                                                user_input, retrieved, tool_descriptions=tool_descriptions
+                                            )
+                                        log("perception", f"Intent: {perception.intent}, Tool hint: {perception.tool_hint}")
+                                    else:
+                                        perception = perception_cache.get(user_input)
+                                        if perception is None:
+                                            with tracer.span("perception"):
+                                                perception = await extract_perception(user_input)
+                                            perception_cache.put(perception)
+                                            log("perception", f"Intent: {perception.intent}, Tool hint: {perception.tool_hint}")
+                                        else:
+                                            log("perception", f"Reused: Intent: {perception.intent}, Tool hint: {perception.tool_hint}")
+
+                                        with tracer.span("plan"):
+                                            plan = await generate_plan(perception, retrieved, tool_descriptions=tool_descriptions)
+                                    log("plan", f"Plan generated: {plan}")
+
+                                    if plan.startswith("FINAL_ANSWER:"):
+                                        log("agent", f"✅ FINAL RESULT: {plan}")
+                                        break
+
+                                    try:
+                                        tool_name, arguments = parse_function_call(plan)
+                                        cached = None
+                                        if tool_name in reusable_tools:
+                                            # A hit is linked to this session as it is: no new item, no embedding
+                                            cached = memory.reuse_tool_result(tool_name, arguments, session_id)
+
+                                        with tracer.span("tool", tool=tool_name, cached=cached is not None):
+                                            if cached is not None:
+                                                result = ToolCallResult(
+                                                    tool_name=tool_name,
+                                                    arguments=arguments,
+                                                    result=cached.tool_result,
+                                                    raw_response=None
+                                                )
+                                                log("tool", f"{result.tool_name} answered from memory: {result.result}")
+                                            else:
+                                                result = await execute_tool(session, tools, plan)
+                                                log("tool", f"{result.tool_name} returned: {result.result}")
+
+                                        if cached is None:
+                                            with tracer.span("memory.add"):
+                                                memory.add(MemoryItem(
+                                                    text=f"Tool call: {result.tool_name} with {result.arguments}, got: {result.result}",
+                                                    type="tool_output",
+                                                    tool_name=result.tool_name,
+                                                    user_query=user_input,
+                                                    tags=[result.tool_name],
+                                                    session_id=session_id,
+                                                    tool_args=result.arguments,
+                                                    tool_result=result.result
+                                                ))
+
+                                        perception_cache.observe(
+                                            result.tool_name, result.result,
+                                            is_error=bool(getattr(result.raw_response, "isError", False))
+                                        )
+                                        user_input = f"Original task: {query}\nPrevious output: {result.result}\nWhat should I do next?"
+
+                                    except Exception as e:
+                                        log("error", f"Tool execution failed: {e}")
+                                        break
 
                                 step += 1
+
+                            with tracer.span("memory.save"):
+                                memory.save(MEMORY_DIR)
+                            log("memory", f"Saved {len(memory.data)} memories to {MEMORY_DIR}")
                         except Exception as e:
                             print(f"[agent] Session initialization error: {str(e)}")
                 except Exception as e:
@@ -107,6 +192,7 @@ async def main(user_input: str):
         print(f"[agent] Overall error: {str(e)}")
 
     log("agent", "Agent session complete.")
+    export_trace(run_id)
 
 if __name__ == "__main__":
     query = input("🧑 What do you want to solve today? → ")
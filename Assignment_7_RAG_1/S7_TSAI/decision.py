@@ -1,9 +1,9 @@
-from perception import PerceptionResult
+from perception import PerceptionResult, parse_perception
 from memory import MemoryItem
-from typing import List, Optional
-from dotenv import load_dotenv
-from google import genai
-import os
+from llm import generate
+from typing import List, Optional, Tuple
+import json
+import re
 
 # Optional: import log from agent if shared, else define locally
 try:
@@ -14,16 +14,24 @@ except ImportError:
         now = datetime.datetime.now().strftime("%H:%M:%S")
         print(f"[{now}] [{stage}] {msg}")
 
-load_dotenv()
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
-def generate_plan(
-    perception: PerceptionResult,
+# Appended to the planning prompt when perception is done in the same call
+PERCEIVE_AND_PLAN_FORMAT = """
+OUTPUT FORMAT (overrides the response format above):
+Return a single JSON object with these keys:
+- "intent": brief phrase about what the user wants
+- "entities": a list of strings representing keywords or values (e.g., ["INDIA", "ASCII"])
+- "tool_hint": name of the MCP tool that might be useful, or null
+- "plan": exactly one FUNCTION_CALL: or FINAL_ANSWER: line, following the rules above
+"""
+
+
+def _plan_prompt(
+    input_summary: str,
     memory_items: List[MemoryItem],
-    tool_descriptions: Optional[str] = None
+    tool_descriptions: Optional[str] = None,
+    output_format: str = ""
 ) -> str:
-    """Generates a plan (tool call or final answer) using LLM based on structured perception and memory."""
-
     memory_texts = "\n".join(f"- {m.text}" for m in memory_items) or "None"
 
     tool_context = f"\nYou have access to the following tools:\n{tool_descriptions}" if tool_descriptions else ""
@@ -47,10 +55,7 @@ Guidelines:
 {memory_texts}
 
 Input Summary:
-- User input: "{perception.user_input}"
-- Intent: {perception.intent}
-- Entities: {', '.join(perception.entities)}
-- Tool hint: {perception.tool_hint or 'None'}
+{input_summary}
 
 ✅ Examples:
 - FUNCTION_CALL: add|a=5|b=3
@@ -76,22 +81,66 @@ IMPORTANT:
 - 🧠 Think before each step. Verify intermediate results mentally before proceeding.
 - 💥 If unsure or no tool fits, skip to FINAL_ANSWER: [unknown]
 - ✅ You have only 3 attempts. Final attempt must be FINAL_ANSWER]
-"""
+{output_format}"""
+    return prompt
+
+
+def _extract_plan(raw: str) -> str:
+    for line in raw.splitlines():
+        if line.strip().startswith("FUNCTION_CALL:") or line.strip().startswith("FINAL_ANSWER:"):
+            return line.strip()
+    return raw.strip()
+
+
+async def generate_plan(
+    perception: PerceptionResult,
+    memory_items: List[MemoryItem],
+    tool_descriptions: Optional[str] = None
+) -> str:
+    """Generates a plan (tool call or final answer) using LLM based on structured perception and memory."""
+
+    input_summary = f"""- User input: "{perception.user_input}"
+- Intent: {perception.intent}
+- Entities: {', '.join(perception.entities)}
+- Tool hint: {perception.tool_hint or 'None'}"""
+    prompt = _plan_prompt(input_summary, memory_items, tool_descriptions)
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
-        raw = response.text.strip()
+        raw = await generate(prompt)
         log("plan", f"LLM output: {raw}")
+        return _extract_plan(raw)
+
+    except Exception as e:
+        log("plan", f"⚠️ Decision generation failed: {e}")
+        return "FINAL_ANSWER: [unknown]"
+
 
-        for line in raw.splitlines():
-            if line.strip().startswith("FUNCTION_CALL:") or line.strip().startswith("FINAL_ANSWER:"):
-                return line.strip()
+async def perceive_and_plan(
+    user_input: str,
+    memory_items: List[MemoryItem],
+    tool_descriptions: Optional[str] = None
+) -> Tuple[PerceptionResult, str]:
+    """Extracts perception and generates the plan in a single structured LLM call.
+
+    Used when the perception is only needed as input to the plan, which saves
+    one LLM round trip per step.
+    """
 
-        return raw.strip()
+    input_summary = f"""- User input: "{user_input}"
+- Intent, entities and tool hint: extract them from the user input"""
+    prompt = _plan_prompt(input_summary, memory_items, tool_descriptions, PERCEIVE_AND_PLAN_FORMAT)
 
+    try:
+        raw = await generate(prompt, json_output=True)
+        log("plan", f"LLM output: {raw}")
     except Exception as e:
         log("plan", f"⚠️ Decision generation failed: {e}")
-        return "FINAL_ANSWER: [unknown]"
+        return PerceptionResult(user_input=user_input, intent=None), "FINAL_ANSWER: [unknown]"
+
+    try:
+        clean = re.sub(r"^```json|```$", "", raw, flags=re.MULTILINE).strip()
+        parsed = json.loads(clean)
+        return parse_perception(user_input, parsed), _extract_plan(str(parsed.get("plan", "")))
+    except Exception as e:
+        log("plan", f"⚠️ Failed to parse structured output: {e}")
+        return PerceptionResult(user_input=user_input, intent=None), _extract_plan(raw)
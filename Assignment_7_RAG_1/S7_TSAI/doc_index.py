@@ -0,0 +1,270 @@
+# doc_index.py - on-disk storage for the search_documents index
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import faiss
+import numpy as np
+
+
+class ChunkStore:
+    """Chunk metadata and per-document chunk ranges in SQLite, keyed by the chunk's
+    id in the FAISS index.
+
+    Only the rows for the top-k search hits are read, so a query never loads
+    the text of the whole corpus.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id INTEGER PRIMARY KEY,"
+            " doc TEXT NOT NULL,"
+            " chunk_id TEXT NOT NULL,"
+            " chunk TEXT NOT NULL)"
+        )
+        # Each indexed document owns the id range [first_id, first_id + count)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " name TEXT PRIMARY KEY,"
+            " hash TEXT NOT NULL,"
+            " first_id INTEGER NOT NULL,"
+            " count INTEGER NOT NULL)"
+        )
+        self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, rows: Iterable[Tuple[int, str, str, str]]):
+        """Insert (id, doc, chunk_id, chunk) rows, replacing rows with the same id."""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (id, doc, chunk_id, chunk) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def get(self, ids: List[int]) -> Dict[int, dict]:
+        """Return {id: {doc, chunk_id, chunk}} for the ids that exist."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, doc, chunk_id, chunk FROM chunks WHERE id IN ({placeholders})",
+                ids,
+            ).fetchall()
+        return {row[0]: {"doc": row[1], "chunk_id": row[2], "chunk": row[3]} for row in rows}
+
+    def documents(self) -> Dict[str, dict]:
+        """Return {name: {hash, first_id, count}} for every indexed document."""
+        with self._lock:
+            rows = self._db.execute("SELECT name, hash, first_id, count FROM documents").fetchall()
+        return {row[0]: {"hash": row[1], "first_id": row[2], "count": row[3]} for row in rows}
+
+    def next_id(self) -> int:
+        """First id that is not used by any chunk row or document range."""
+        with self._lock:
+            max_chunk = self._db.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM chunks").fetchone()[0]
+            max_doc = self._db.execute(
+                "SELECT COALESCE(MAX(first_id + count), 0) FROM documents"
+            ).fetchone()[0]
+        return max(max_chunk, max_doc)
+
+    def commit_documents(self, documents: Dict[str, dict]):
+        """Make documents the full set of indexed documents and drop chunk rows outside their ranges."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM documents")
+            self._db.executemany(
+                "INSERT INTO documents (name, hash, first_id, count) VALUES (?, ?, ?, ?)",
+                [(name, d["hash"], d["first_id"], d["count"]) for name, d in documents.items()],
+            )
+            self._db.execute(
+                "DELETE FROM chunks WHERE NOT EXISTS ("
+                " SELECT 1 FROM documents d"
+                " WHERE chunks.id >= d.first_id AND chunks.id < d.first_id + d.count)"
+            )
+
+    def reset(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM chunks")
+            self._db.execute("DELETE FROM documents")
+
+
+def chunk_text(text, size, overlap):
+    words = text.split()
+    for i in range(0, len(words), size - overlap):
+        yield " ".join(words[i:i+size])
+
+
+_converter = None
+
+
+def convert_document(path: str, size: int, overlap: int) -> List[str]:
+    """Convert a document to markdown and split it into chunks.
+
+    Runs in a worker process, so the MarkItDown converter is created once per process.
+    """
+    global _converter
+    if _converter is None:
+        from markitdown import MarkItDown
+        _converter = MarkItDown()
+    markdown = _converter.convert(path).text_content
+    return list(chunk_text(markdown, size, overlap))
+
+
+def live_ids(documents: Dict[str, dict]) -> np.ndarray:
+    """All ids covered by the documents' chunk ranges."""
+    ranges = [np.arange(d["first_id"], d["first_id"] + d["count"], dtype=np.int64) for d in documents.values()]
+    return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+
+def load_index_for_update(index_file: Path):
+    """Load the index for modification as an IndexIDMap2, or None if there is no usable index.
+
+    Indexes from before id mapping cannot be mapped back to documents and are discarded.
+    """
+    if not Path(index_file).exists():
+        return None
+    index = faiss.read_index(str(index_file))
+    if not isinstance(index, faiss.IndexIDMap2):
+        return None
+    return index
+
+
+def apply_update(index, vectors: np.ndarray, ids: np.ndarray, documents: Dict[str, dict]):
+    """Add new vectors and remove every id that no longer belongs to a live document range.
+
+    This single pass drops the chunks of changed and deleted documents as well as
+    any strays left behind by an interrupted update. Returns the updated index.
+    """
+    if len(ids):
+        if index is None:
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids.astype(np.int64))
+    if index is not None and index.ntotal:
+        current = faiss.vector_to_array(index.id_map)
+        stale = np.setdiff1d(current, live_ids(documents))
+        if len(stale):
+            index.remove_ids(stale)
+    return index
+
+
+def write_index(index, path: Path):
+    """Write a FAISS index to a temp file and rename it into place."""
+    tmp_path = str(path) + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, str(path))
+
+
+class SearchIndex:
+    """Read-only FAISS index opened with IO_FLAG_MMAP and kept open across queries.
+
+    The file is reopened only when its mtime changes, i.e. after the indexer
+    has renamed a new index into place.
+    """
+
+    def __init__(self, index_file: Path, chunk_store: ChunkStore):
+        self.index_file = Path(index_file)
+        self.chunk_store = chunk_store
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+
+    def _current(self):
+        mtime = self.index_file.stat().st_mtime_ns
+        with self._lock:
+            if self._index is None or mtime != self._mtime:
+                self._index = faiss.read_index(str(self.index_file), faiss.IO_FLAG_MMAP)
+                self._mtime = mtime
+            return self._index
+
+    def search(self, query_vec: np.ndarray, k: int = 5) -> List[dict]:
+        """Return the metadata of the k nearest chunks, closest first."""
+        index = self._current()
+        D, I = index.search(np.asarray(query_vec, dtype=np.float32).reshape(1, -1), k)
+        ids = [int(i) for i in I[0] if i != -1]
+        rows = self.chunk_store.get(ids)
+        return [rows[i] for i in ids if i in rows]
+
+
+class IndexingService:
+    """Runs the index build in a background thread and tracks its progress.
+
+    build_fn(progress) is called with a progress(stage, done, total) callback.
+    is_ready() tells whether a usable index snapshot exists; while a rebuild runs,
+    searches keep using the last snapshot written to disk.
+    """
+
+    def __init__(self, build_fn: Callable, is_ready: Callable[[], bool]):
+        self.build_fn = build_fn
+        self.is_ready = is_ready
+        self._lock = threading.Lock()
+        self._thread = None
+        self._rerun = False
+        self._status = {
+            "state": "idle",
+            "stage": None,
+            "done": 0,
+            "total": 0,
+            "started_at": None,
+            "finished_at": None,
+            "last_build_seconds": None,
+            "error": None,
+        }
+
+    def _progress(self, stage: str, done: int, total: int):
+        with self._lock:
+            self._status.update(stage=stage, done=done, total=total)
+
+    def _run(self):
+        while True:
+            start = time.time()
+            with self._lock:
+                self._rerun = False
+                self._status.update(state="indexing", stage="starting", done=0, total=0,
+                                    started_at=start, error=None)
+            try:
+                self.build_fn(self._progress)
+                state, error = "ready", None
+            except Exception as e:
+                state, error = "failed", str(e)
+            with self._lock:
+                self._status.update(state=state, error=error, finished_at=time.time(),
+                                    last_build_seconds=round(time.time() - start, 2))
+                if not self._rerun:
+                    self._thread = None
+                    return
+
+    def start(self):
+        """Start a build in the background; if one is running, run another after it."""
+        with self._lock:
+            if self._thread is not None:
+                self._rerun = True
+                return
+            self._thread = threading.Thread(target=self._run, name="doc-indexer", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for the running build to finish. Returns False on timeout."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def status(self) -> dict:
+        with self._lock:
+            status = dict(self._status)
+        status["ready"] = self.is_ready()
+        return status
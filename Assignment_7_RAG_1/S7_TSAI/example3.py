@@ -2,41 +2,68 @@ from mcp.server.fastmcp import FastMCP, Image
 from mcp.server.fastmcp.prompts import base
 from mcp.types import TextContent
 from mcp import types
-from PIL import Image as PILImage
 import math
 import sys
 import os
 import json
-import faiss
 import numpy as np
 from pathlib import Path
 import requests
-from markitdown import MarkItDown
-import time
 from models import AddInput, AddOutput, SqrtInput, SqrtOutput, StringsToIntsInput, StringsToIntsOutput, ExpSumInput, ExpSumOutput
-from PIL import Image as PILImage
-from tqdm import tqdm
 import hashlib
+import threading
+from doc_index import ChunkStore, SearchIndex, IndexingService, write_index, load_index_for_update, apply_update, convert_document
+from tool_cache import ToolResultCache
+import numeric
+from offload import ProcessOffloader
+import imaging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 
 mcp = FastMCP("Calculator")
 
+# Results of pure tools (output depends only on the arguments), shared by all sessions
+TOOL_CACHE_SIZE = 1024
+tool_cache = ToolResultCache(maxsize=TOOL_CACHE_SIZE)
+
+# CPU-bound tools (factorial, power, create_thumbnail) run in worker processes
+CPU_TOOL_WORKERS = os.cpu_count() or 1
+CPU_TOOL_TIMEOUT = 30  # seconds per call
+cpu_pool = ProcessOffloader(max_workers=CPU_TOOL_WORKERS, timeout=CPU_TOOL_TIMEOUT)
+
 EMBED_URL = "http://localhost:11434/api/embeddings"
 EMBED_MODEL = "nomic-embed-text"
 CHUNK_SIZE = 256
 CHUNK_OVERLAP = 40
+CONVERT_WORKERS = os.cpu_count() or 1  # processes converting PDF/DOCX files
+EMBED_WORKERS = 8  # embedding requests in flight
 ROOT = Path(__file__).parent.resolve()
-
-def get_embedding(text: str) -> np.ndarray:
-    response = requests.post(EMBED_URL, json={"model": EMBED_MODEL, "prompt": text})
+INDEX_DIR = ROOT / "faiss_index"
+INDEX_FILE = INDEX_DIR / "index.bin"
+CHUNKS_DB = INDEX_DIR / "chunks.db"
+
+# Worker processes (CPU tools, document conversion) are spawned, and each one
+# re-imports this script as __mp_main__; so importing it must not touch the
+# index folder. The chunk store and search index are opened on first use.
+_storage_lock = threading.Lock()
+_storage = None
+
+def get_storage():
+    """The (chunk_store, search_index) pair, opened on first call."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            INDEX_DIR.mkdir(exist_ok=True)
+            chunk_store = ChunkStore(CHUNKS_DB)
+            _storage = (chunk_store, SearchIndex(INDEX_FILE, chunk_store))
+        return _storage
+
+def get_embedding(text: str, session=requests) -> np.ndarray:
+    response = session.post(EMBED_URL, json={"model": EMBED_MODEL, "prompt": text})
     response.raise_for_status()
     return np.array(response.json()["embedding"], dtype=np.float32)
 
-def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    words = text.split()
-    for i in range(0, len(words), size - overlap):
-        yield " ".join(words[i:i+size])
-
 def mcp_log(level: str, message: str) -> None:
     """Log a message to stderr to avoid interfering with JSON communication"""
     sys.stderr.write(f"{level}: {message}\n")
@@ -45,149 +72,142 @@ def mcp_log(level: str, message: str) -> None:
 @mcp.tool()
 def search_documents(query: str) -> list[str]:
     """Search for relevant content from uploaded documents."""
-    ensure_faiss_ready()
+    if not ensure_faiss_ready():
+        status = indexing_service.status()
+        return [f"Documents are still being indexed ({status['stage']}: {status['done']}/{status['total']}). Try again shortly."]
     mcp_log("SEARCH", f"Query: {query}")
     try:
-        index = faiss.read_index(str(ROOT / "faiss_index" / "index.bin"))
-        metadata = json.loads((ROOT / "faiss_index" / "metadata.json").read_text())
-        query_vec = get_embedding(query).reshape(1, -1)
-        D, I = index.search(query_vec, k=5)
+        query_vec = get_embedding(query)
+        _, search_index = get_storage()
         results = []
-        for idx in I[0]:
-            data = metadata[idx]
+        for data in search_index.search(query_vec, k=5):
             results.append(f"{data['chunk']}\n[Source: {data['doc']}, ID: {data['chunk_id']}]")
         return results
     except Exception as e:
         return [f"ERROR: Failed to search: {str(e)}"]
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def add(input: AddInput) -> AddOutput:
     print("CALLED: add(AddInput) -> AddOutput")
     return AddOutput(result=input.a + input.b)
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def sqrt(input: SqrtInput) -> SqrtOutput:
     """Square root of a number"""
     print("CALLED: sqrt(SqrtInput) -> SqrtOutput")
     return SqrtOutput(result=input.a ** 0.5)
 
 # subtraction tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def subtract(a: int, b: int) -> int:
     """Subtract two numbers"""
     print("CALLED: subtract(a: int, b: int) -> int:")
     return int(a - b)
 
 # multiplication tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def multiply(a: int, b: int) -> int:
     """Multiply two numbers"""
     print("CALLED: multiply(a: int, b: int) -> int:")
     return int(a * b)
 
 #  division tool
-@mcp.tool() 
+@tool_cache.tool(mcp)
 def divide(a: int, b: int) -> float:
     """Divide two numbers"""
     print("CALLED: divide(a: int, b: int) -> float:")
     return float(a / b)
 
 # power tool
-@mcp.tool()
-def power(a: int, b: int) -> int:
+@tool_cache.tool(mcp)
+async def power(a: int, b: int) -> int:
     """Power of two numbers"""
     print("CALLED: power(a: int, b: int) -> int:")
-    return int(a ** b)
+    return await cpu_pool.run(numeric.power, a, b)
 
 
 # cube root tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def cbrt(a: int) -> float:
     """Cube root of a number"""
     print("CALLED: cbrt(a: int) -> float:")
     return float(a ** (1/3))
 
 # factorial tool
-@mcp.tool()
-def factorial(a: int) -> int:
+@tool_cache.tool(mcp)
+async def factorial(a: int) -> int:
     """factorial of a number"""
     print("CALLED: factorial(a: int) -> int:")
-    return int(math.factorial(a))
+    return int(await cpu_pool.run(numeric.factorial, a))
 
 # log tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def log(a: int) -> float:
     """log of a number"""
     print("CALLED: log(a: int) -> float:")
     return float(math.log(a))
 
 # remainder tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def remainder(a: int, b: int) -> int:
     """remainder of two numbers divison"""
     print("CALLED: remainder(a: int, b: int) -> int:")
     return int(a % b)
 
 # sin tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def sin(a: int) -> float:
     """sin of a number"""
     print("CALLED: sin(a: int) -> float:")
     return float(math.sin(a))
 
 # cos tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def cos(a: int) -> float:
     """cos of a number"""
     print("CALLED: cos(a: int) -> float:")
     return float(math.cos(a))
 
 # tan tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def tan(a: int) -> float:
     """tan of a number"""
     print("CALLED: tan(a: int) -> float:")
     return float(math.tan(a))
 
 # mine tool
-@mcp.tool()
+@tool_cache.tool(mcp)
 def mine(a: int, b: int) -> int:
     """special mining tool"""
     print("CALLED: mine(a: int, b: int) -> int:")
     return int(a - b - b)
 
 @mcp.tool()
-def create_thumbnail(image_path: str) -> Image:
+async def create_thumbnail(image_path: str) -> Image:
     """Create a thumbnail from an image"""
     print("CALLED: create_thumbnail(image_path: str) -> Image:")
-    img = PILImage.open(image_path)
-    img.thumbnail((100, 100))
-    return Image(data=img.tobytes(), format="png")
+    data = await cpu_pool.run(imaging.thumbnail_bytes, image_path)
+    return Image(data=data, format="png")
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def strings_to_chars_to_int(input: StringsToIntsInput) -> StringsToIntsOutput:
     """Return the ASCII values of the characters in a word"""
     print("CALLED: strings_to_chars_to_int(StringsToIntsInput) -> StringsToIntsOutput")
     ascii_values = [ord(char) for char in input.string]
     return StringsToIntsOutput(ascii_values=ascii_values)
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def int_list_to_exponential_sum(input: ExpSumInput) -> ExpSumOutput:
     """Return sum of exponentials of numbers in a list"""
     print("CALLED: int_list_to_exponential_sum(ExpSumInput) -> ExpSumOutput")
-    result = sum(math.exp(i) for i in input.int_list)
+    result = numeric.exp_sum(input.int_list)
     return ExpSumOutput(result=result)
 
-@mcp.tool()
+@tool_cache.tool(mcp)
 def fibonacci_numbers(n: int) -> list:
     """Return the first n Fibonacci Numbers"""
     print("CALLED: fibonacci_numbers(n: int) -> list:")
-    if n <= 0:
-        return []
-    fib_sequence = [0, 1]
-    for _ in range(2, n):
-        fib_sequence.append(fib_sequence[-1] + fib_sequence[-2])
-    return fib_sequence[:n]
+    return numeric.fibonacci_numbers(n)
 
 # DEFINE RESOURCES
 
@@ -199,6 +219,19 @@ def get_greeting(name: str) -> str:
     return f"Hello, {name}!"
 
 
+# Hit statistics of the pure tool result cache
+@mcp.resource("stats://tool_cache")
+def get_tool_cache_stats() -> str:
+    """Size and hit/miss counts of the tool result cache"""
+    return json.dumps(tool_cache.stats(), indent=2)
+
+# Process pool usage of the CPU-bound tools
+@mcp.resource("stats://process_pool")
+def get_process_pool_stats() -> str:
+    """Calls, timeouts, cancellations and restarts of the CPU tool process pool"""
+    return json.dumps(cpu_pool.stats(), indent=2)
+
+
 # DEFINE AVAILABLE PROMPTS
 @mcp.prompt()
 def review_code(code: str) -> str:
@@ -214,95 +247,140 @@ def debug_error(error: str) -> list[base.Message]:
         base.AssistantMessage("I'll help debug that. What have you tried so far?"),
     ]
 
-def process_documents():
-    """Process documents and create FAISS index"""
+def process_documents(progress=None):
+    """Process documents and create or update the FAISS index.
+
+    Each document owns a contiguous range of index ids. Changed and deleted
+    documents have their vectors and chunk rows removed, so the index only
+    ever holds the live corpus.
+
+    Files are converted in a process pool and their chunks embedded by a bounded
+    pool of concurrent requests; results are merged into the index in file order.
+    progress(stage, done, total) is called as files are converted and merged.
+    """
+    progress = progress or (lambda stage, done, total: None)
     mcp_log("INFO", "Indexing documents with MarkItDown...")
-    ROOT = Path(__file__).parent.resolve()
     DOC_PATH = ROOT / "documents"
-    INDEX_CACHE = ROOT / "faiss_index"
-    INDEX_CACHE.mkdir(exist_ok=True)
-    INDEX_FILE = INDEX_CACHE / "index.bin"
-    METADATA_FILE = INDEX_CACHE / "metadata.json"
-    CACHE_FILE = INDEX_CACHE / "doc_index_cache.json"
 
     def file_hash(path):
         return hashlib.md5(Path(path).read_bytes()).hexdigest()
 
-    CACHE_META = json.loads(CACHE_FILE.read_text()) if CACHE_FILE.exists() else {}
-    metadata = json.loads(METADATA_FILE.read_text()) if METADATA_FILE.exists() else []
-    index = faiss.read_index(str(INDEX_FILE)) if INDEX_FILE.exists() else None
-    all_embeddings = []
-    converter = MarkItDown()
-
-    for file in DOC_PATH.glob("*.*"):
+    chunk_store, _ = get_storage()
+    index = load_index_for_update(INDEX_FILE)
+    if index is None:
+        # No index, or one without id mapping: rebuild everything
+        chunk_store.reset()
+    documents = chunk_store.documents()
+    next_id = chunk_store.next_id()
+    files = {file.name: file for file in DOC_PATH.glob("*.*")}
+    new_rows = []
+    new_vectors = []
+
+    changed = {}
+    for name, file in files.items():
         fhash = file_hash(file)
-        if file.name in CACHE_META and CACHE_META[file.name] == fhash:
-            mcp_log("SKIP", f"Skipping unchanged file: {file.name}")
-            continue
-
-        mcp_log("PROC", f"Processing: {file.name}")
-        try:
-            result = converter.convert(str(file))
-            markdown = result.text_content
-            chunks = list(chunk_text(markdown))
-            embeddings_for_file = []
-            new_metadata = []
-            for i, chunk in enumerate(tqdm(chunks, desc=f"Embedding {file.name}")):
-                embedding = get_embedding(chunk)
-                embeddings_for_file.append(embedding)
-                new_metadata.append({"doc": file.name, "chunk": chunk, "chunk_id": f"{file.stem}_{i}"})
-            if embeddings_for_file:
-                if index is None:
-                    dim = len(embeddings_for_file[0])
-                    index = faiss.IndexFlatL2(dim)
-                index.add(np.stack(embeddings_for_file))
-                metadata.extend(new_metadata)
-            CACHE_META[file.name] = fhash
-        except Exception as e:
-            mcp_log("ERROR", f"Failed to process {file.name}: {e}")
-
-    CACHE_FILE.write_text(json.dumps(CACHE_META, indent=2))
-    METADATA_FILE.write_text(json.dumps(metadata, indent=2))
-    if index and index.ntotal > 0:
-        faiss.write_index(index, str(INDEX_FILE))
-        mcp_log("SUCCESS", "Saved FAISS index and metadata")
-    else:
+        if name in documents and documents[name]["hash"] == fhash:
+            mcp_log("SKIP", f"Skipping unchanged file: {name}")
+        else:
+            changed[name] = fhash
+
+    # Convert files in worker processes and start embedding each file's chunks
+    # as soon as its conversion finishes
+    chunks_by_file = {}
+    embeddings_by_file = {}
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=EMBED_WORKERS))
+    with ProcessPoolExecutor(max_workers=min(CONVERT_WORKERS, max(len(changed), 1))) as converters, \
+            ThreadPoolExecutor(max_workers=EMBED_WORKERS) as embedders:
+        conversions = {
+            converters.submit(convert_document, str(files[name]), CHUNK_SIZE, CHUNK_OVERLAP): name
+            for name in changed
+        }
+        for converted, future in enumerate(as_completed(conversions), 1):
+            name = conversions[future]
+            progress("converting", converted, len(changed))
+            try:
+                chunks_by_file[name] = future.result()
+            except Exception as e:
+                mcp_log("ERROR", f"Failed to convert {name}: {e}")
+                continue
+            mcp_log("PROC", f"Converted {name}: {len(chunks_by_file[name])} chunks")
+            embeddings_by_file[name] = [
+                embedders.submit(get_embedding, chunk, session) for chunk in chunks_by_file[name]
+            ]
+
+        # Merge in file order so ids are assigned deterministically
+        for merged, name in enumerate(changed, 1):
+            progress("embedding", merged, len(changed))
+            if name not in chunks_by_file:
+                continue
+            chunks = chunks_by_file[name]
+            try:
+                embeddings_for_file = [future.result() for future in embeddings_by_file[name]]
+            except Exception as e:
+                # Keep serving the previous version of the document
+                mcp_log("ERROR", f"Failed to embed {name}: {e}")
+                continue
+            stem = files[name].stem
+            new_rows.extend((next_id + i, name, f"{stem}_{i}", chunk) for i, chunk in enumerate(chunks))
+            new_vectors.extend(embeddings_for_file)
+            documents[name] = {"hash": changed[name], "first_id": next_id, "count": len(chunks)}
+            next_id += len(chunks)
+
+    for name in [name for name in documents if name not in files]:
+        mcp_log("DEL", f"Removing deleted file: {name}")
+        del documents[name]
+
+    ids = np.array([row[0] for row in new_rows], dtype=np.int64)
+    vectors = np.stack(new_vectors) if new_vectors else None
+    stale_before = index.ntotal if index is not None else 0
+    index = apply_update(index, vectors, ids, documents)
+    index_changed = index is not None and (len(ids) or index.ntotal != stale_before)
+    # Documents without chunks (empty files) change only the document table
+    if not index_changed and documents == chunk_store.documents():
         mcp_log("WARN", "No new documents or updates to process.")
-
-def ensure_faiss_ready():
-    from pathlib import Path
-    index_path = ROOT / "faiss_index" / "index.bin"
-    meta_path = ROOT / "faiss_index" / "metadata.json"
-    if not (index_path.exists() and meta_path.exists()):
-        mcp_log("INFO", "Index not found — running process_documents()...")
-        process_documents()
-    else:
-        mcp_log("INFO", "Index already exists. Skipping regeneration.")
+        return
+
+    # New chunk rows go in before the index that references them is swapped in;
+    # rows of replaced documents are dropped only afterwards
+    chunk_store.add(new_rows)
+    if index_changed:
+        write_index(index, INDEX_FILE)
+    chunk_store.commit_documents(documents)
+    total = index.ntotal if index is not None else 0
+    mcp_log("SUCCESS", f"Saved FAISS index with {total} chunks from {len(documents)} documents")
+
+def index_ready() -> bool:
+    if not INDEX_FILE.exists():
+        return False
+    chunk_store, _ = get_storage()
+    return bool(chunk_store.documents())
+
+indexing_service = IndexingService(process_documents, index_ready)
+
+def ensure_faiss_ready() -> bool:
+    """Return whether an index can be searched; if not, make sure a build is running."""
+    if index_ready():
+        return True
+    mcp_log("INFO", "Index not found — indexing in the background...")
+    if indexing_service.status()["state"] != "indexing":
+        indexing_service.start()
+    return False
+
+# Indexing status and progress
+@mcp.resource("index://status")
+def get_index_status() -> str:
+    """Readiness and progress of the document index"""
+    return json.dumps(indexing_service.status(), indent=2)
 
 
 if __name__ == "__main__":
     print("STARTING THE SERVER AT AMAZING LOCATION")
 
-    
-    
+    # Index documents in the background; searches use the last good index meanwhile
+    indexing_service.start()
+
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
         mcp.run() # Run without transport for dev server
     else:
-        # Start the server in a separate thread
-        import threading
-        server_thread = threading.Thread(target=lambda: mcp.run(transport="stdio"))
-        server_thread.daemon = True
-        server_thread.start()
-        
-        # Wait a moment for the server to start
-        time.sleep(2)
-        
-        # Process documents after server is running
-        process_documents()
-        
-        # Keep the main thread alive
-        try:
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            print("\nShutting down...")
+        mcp.run(transport="stdio")
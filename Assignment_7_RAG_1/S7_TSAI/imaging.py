@@ -0,0 +1,15 @@
+# imaging.py - image work for the thumbnail tool, run in the process pool
+# Kept identical in Assignment_5 and Assignment_7_RAG_1/S7_TSAI: each calculator
+# server is run standalone from its own folder. Change both copies together.
+# Worker processes import it, so it must stay free of import-time side effects.
+
+from PIL import Image as PILImage
+
+THUMBNAIL_SIZE = (100, 100)
+
+
+def thumbnail_bytes(image_path: str) -> bytes:
+    """Raw pixel bytes of a thumbnail of the image."""
+    img = PILImage.open(image_path)
+    img.thumbnail(THUMBNAIL_SIZE)
+    return img.tobytes()
@@ -0,0 +1,25 @@
+# llm.py - Gemini client shared by perception and decision
+
+import os
+from dotenv import load_dotenv
+from google import genai
+from tracing import record_llm_usage
+
+load_dotenv()
+
+MODEL = "gemini-2.0-flash"
+
+# One client for the whole agent, so every call reuses its HTTP connection pool
+client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+async def generate(prompt: str, json_output: bool = False) -> str:
+    """Run a prompt through the async client without blocking the event loop; returns the text."""
+    config = {"response_mime_type": "application/json"} if json_output else None
+    response = await client.aio.models.generate_content(
+        model=MODEL,
+        contents=prompt,
+        config=config
+    )
+    record_llm_usage(response)
+    return response.text.strip()
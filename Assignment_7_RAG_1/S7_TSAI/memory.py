@@ -1,12 +1,20 @@
 # memory.py
 
+import json
+import mmap
+import os
+import shutil
 import numpy as np
 import faiss
 import requests
-from typing import List, Optional, Literal
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Literal
 from pydantic import BaseModel
 from datetime import datetime
 
+from tracing import tracer
+
 
 class MemoryItem(BaseModel):
     text: str
@@ -16,33 +24,173 @@ class MemoryItem(BaseModel):
     user_query: Optional[str] = None
     tags: List[str] = []
     session_id: Optional[str] = None
+    tool_args: Optional[Dict[str, Any]] = None
+    tool_result: Optional[Any] = None
+
+
+def tool_call_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Canonical key of a tool call, independent of argument order."""
+    return f"{tool_name}:{json.dumps(arguments, sort_keys=True, default=str)}"
+
+
+class ItemSnapshot:
+    """Columns of a snapshot written by MemoryManager.save().
+
+    Snapshot layout (one folder):
+      index.faiss      the FAISS index
+      texts.bin        item texts, UTF-8, concatenated
+      columns.npz      int32 dictionary codes for type/session_id/tool_name/user_query
+                       (-1 = None) and the int64 text offsets
+      items.json       the dictionaries and the remaining per-item columns
+
+    Everything but the texts is read up front; texts.bin is memory-mapped and
+    decoded one item at a time.
+    """
+
+    DICT_COLUMNS = ("type", "session_id", "tool_name", "user_query")
+    JSON_COLUMNS = ("timestamp", "tags", "tool_args", "tool_result")
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        with open(self.folder / "items.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.count: int = meta["count"]
+        self.dictionaries: Dict[str, list] = meta["dictionaries"]
+        self.columns: Dict[str, list] = {name: meta[name] for name in self.JSON_COLUMNS}
+        with np.load(self.folder / "columns.npz") as npz:
+            self.codes: Dict[str, np.ndarray] = {name: npz[name] for name in npz.files}
+        self.offsets: np.ndarray = self.codes.pop("text_offsets")
+
+        self._file = None
+        self.texts = b""  # mmap cannot map an empty file
+        if self.offsets[-1]:
+            self._file = open(self.folder / "texts.bin", "rb")
+            self.texts = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def value(self, name: str, idx: int):
+        code = int(self.codes[name][idx])
+        return None if code < 0 else self.dictionaries[name][code]
+
+    def item(self, idx: int) -> MemoryItem:
+        text = self.texts[self.offsets[idx]:self.offsets[idx + 1]].decode("utf-8")
+        fields = {name: self.value(name, idx) for name in self.DICT_COLUMNS}
+        fields.update({name: self.columns[name][idx] for name in self.JSON_COLUMNS})
+        return MemoryItem(text=text, **fields)
+
+    def close(self):
+        """Release texts.bin (it cannot be replaced on Windows while mapped)."""
+        if self._file is not None:
+            self.texts.close()
+            self._file.close()
+            self._file = None
+            self.texts = b""
+
+
+class LazyItemList:
+    """List of MemoryItems where the items of a loaded snapshot are only built,
+    and their text only read, when they are accessed. New items live in memory."""
+
+    def __init__(self, snapshot: Optional[ItemSnapshot] = None):
+        self.snapshot = snapshot
+        self._count = snapshot.count if snapshot is not None else 0
+        self._loaded: Dict[int, MemoryItem] = {}
+        self.new_items: List[MemoryItem] = []
+
+    def __len__(self):
+        return self._count + len(self.new_items)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        if idx >= self._count:
+            return self.new_items[idx - self._count]
+        item = self._loaded.get(idx)
+        if item is None:
+            item = self._loaded[idx] = self.snapshot.item(idx)
+        return item
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def append(self, item: MemoryItem):
+        self.new_items.append(item)
+
+    def extend(self, items: Iterable[MemoryItem]):
+        self.new_items.extend(items)
 
 
 class MemoryManager:
-    def __init__(self, embedding_model_url="http://localhost:11434/api/embeddings", model_name="nomic-embed-text"):
+    def __init__(self, embedding_model_url="http://localhost:11434/api/embed", model_name="nomic-embed-text", batch_size=64):
         self.embedding_model_url = embedding_model_url
         self.model_name = model_name
+        self.batch_size = batch_size
         self.index = None
-        self.data: List[MemoryItem] = []
-        self.embeddings: List[np.ndarray] = []
+        self.data = LazyItemList()
+        # Inverted indexes: attribute value -> ids of the items with it, in insertion order
+        self.by_session: Dict[Optional[str], List[int]] = defaultdict(list)
+        self.by_type: Dict[str, List[int]] = defaultdict(list)
+        self.by_tag: Dict[str, List[int]] = defaultdict(list)
+        # tool_call_key -> id of the latest item holding that call's result
+        self.tool_calls: Dict[str, int] = {}
+
+    def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in batches; returns a contiguous float32 (len(texts), dim) matrix."""
+        if self.embedding_model_url.endswith("/api/embeddings"):
+            # Legacy single-prompt endpoint
+            rows = []
+            for text in texts:
+                response = requests.post(self.embedding_model_url, json={"model": self.model_name, "prompt": text})
+                response.raise_for_status()
+                tracer.add(embedding_calls=1, embedded_texts=1)
+                rows.append(response.json()["embedding"])
+            return np.ascontiguousarray(rows, dtype=np.float32)
+
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            response = requests.post(
+                self.embedding_model_url,
+                json={"model": self.model_name, "input": texts[start:start + self.batch_size]}
+            )
+            response.raise_for_status()
+            tracer.add(embedding_calls=1, embedded_texts=len(texts[start:start + self.batch_size]))
+            batches.append(np.asarray(response.json()["embeddings"], dtype=np.float32))
+        return np.ascontiguousarray(np.vstack(batches))
 
     def _get_embedding(self, text: str) -> np.ndarray:
-        response = requests.post(
-            self.embedding_model_url,
-            json={"model": self.model_name, "prompt": text}
-        )
-        response.raise_for_status()
-        return np.array(response.json()["embedding"], dtype=np.float32)
+        return self._get_embeddings([text])[0]
 
     def add(self, item: MemoryItem):
-        emb = self._get_embedding(item.text)
-        self.embeddings.append(emb)
-        self.data.append(item)
+        self.bulk_add([item])
 
-        # Initialize or add to index
-        if self.index is None:
-            self.index = faiss.IndexFlatL2(len(emb))
-        self.index.add(np.stack([emb]))
+    def _candidate_ids(
+        self,
+        type_filter: Optional[str],
+        tag_filter: Optional[List[str]],
+        session_filter: Optional[str]
+    ) -> np.ndarray:
+        """Ids of the items that pass every filter, looked up in the inverted indexes."""
+        id_sets = []
+        if session_filter:
+            id_sets.append(np.asarray(self.by_session.get(session_filter, []), dtype=np.int64))
+        if type_filter:
+            id_sets.append(np.asarray(self.by_type.get(type_filter, []), dtype=np.int64))
+        if tag_filter:
+            tagged = [self.by_tag.get(tag, []) for tag in tag_filter]
+            id_sets.append(np.unique(np.concatenate([np.asarray(t, dtype=np.int64) for t in tagged])))
+
+        # Intersect starting from the smallest set
+        id_sets.sort(key=len)
+        ids = id_sets[0]
+        for other in id_sets[1:]:
+            if len(ids) == 0:
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        return ids
 
     def retrieve(
         self,
@@ -52,36 +200,163 @@ class MemoryManager:
         tag_filter: Optional[List[str]] = None,
         session_filter: Optional[str] = None
     ) -> List[MemoryItem]:
-        if not self.index or len(self.data) == 0:
+        if self.index is None or len(self.data) == 0:
             return []
 
-        query_vec = self._get_embedding(query).reshape(1, -1)
-        D, I = self.index.search(query_vec, top_k * 2)  # Overfetch to allow filtering
+        if not (type_filter or tag_filter or session_filter):
+            query_vec = self._get_embedding(query).reshape(1, -1)
+            D, I = self.index.search(query_vec, min(top_k, self.index.ntotal))
+            return [self.data[idx] for idx in I[0] if idx != -1]
 
-        results = []
-        for idx in I[0]:
-            if idx >= len(self.data):
-                continue
-            item = self.data[idx]
+        # Rank only the matching items, so the result is the exact top_k among
+        # them and the cost does not grow with the number of other sessions
+        ids = self._candidate_ids(type_filter, tag_filter, session_filter)
+        if len(ids) == 0:
+            return []
 
-            # Filter by type
-            if type_filter and item.type != type_filter:
-                continue
+        query_vec = self._get_embedding(query)
+        vecs = self.index.reconstruct_batch(ids)
+        dists = ((vecs - query_vec) ** 2).sum(axis=1)
+        if len(ids) > top_k:
+            nearest = np.argpartition(dists, top_k)[:top_k]
+        else:
+            nearest = np.arange(len(ids))
+        nearest = nearest[np.argsort(dists[nearest], kind="stable")]
+        return [self.data[ids[i]] for i in nearest]
 
-            # Filter by tags
-            if tag_filter and not any(tag in item.tags for tag in tag_filter):
-                continue
+    def bulk_add(self, items: List[MemoryItem]):
+        if not items:
+            return
+        embs = self._get_embeddings([item.text for item in items])
 
-            # Filter by session
-            if session_filter and item.session_id != session_filter:
-                continue
+        # Initialize or add to index
+        if self.index is None:
+            self.index = faiss.IndexFlatL2(embs.shape[1])
+        self.index.add(embs)
 
-            results.append(item)
-            if len(results) >= top_k:
-                break
+        for item in items:
+            idx = len(self.data)
+            self.data.append(item)
+            self._index_item(idx, item.type, item.session_id, item.tags, item.tool_name, item.tool_args)
 
-        return results
+    def _index_item(self, idx, type_, session_id, tags, tool_name, tool_args):
+        self.by_session[session_id].append(idx)
+        self.by_type[type_].append(idx)
+        for tag in set(tags):
+            self.by_tag[tag].append(idx)
+        if tool_name and tool_args is not None:
+            self.tool_calls[tool_call_key(tool_name, tool_args)] = idx
 
-    def bulk_add(self, items: List[MemoryItem]):
-        for item in items:
-            self.add(item)
+    def find_tool_result(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[MemoryItem]:
+        """Return the stored output of an earlier identical tool call, if any."""
+        idx = self.tool_calls.get(tool_call_key(tool_name, arguments))
+        return None if idx is None else self.data[idx]
+
+    def reuse_tool_result(self, tool_name: str, arguments: Dict[str, Any], session_id: Optional[str]) -> Optional[MemoryItem]:
+        """Return the stored output of an earlier identical tool call and make it
+        retrievable in session_id, without embedding or storing it again."""
+        idx = self.tool_calls.get(tool_call_key(tool_name, arguments))
+        if idx is None or self.data[idx].tool_result is None:
+            return None
+        if idx not in self.by_session[session_id]:
+            self.by_session[session_id].append(idx)
+        return self.data[idx]
+
+    def save(self, folder):
+        """Write a snapshot of the index and items, replacing any previous one.
+
+        Items of the loaded snapshot are copied column by column (texts as raw
+        bytes) without being built; only items added since are encoded.
+        """
+        folder = Path(folder)
+        staging = folder.with_name(folder.name + ".staging")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        if self.index is not None:
+            faiss.write_index(self.index, str(staging / "index.faiss"))
+
+        snapshot, new_items = self.data.snapshot, self.data.new_items
+        kept = snapshot.count if snapshot is not None else 0
+        total = kept + len(new_items)
+
+        offsets = np.zeros(total + 1, dtype=np.int64)
+        with open(staging / "texts.bin", "wb") as f:
+            if snapshot is not None:
+                offsets[:kept + 1] = snapshot.offsets
+                f.write(snapshot.texts[:snapshot.offsets[-1]])
+            for i, item in enumerate(new_items, start=kept):
+                encoded = item.text.encode("utf-8")
+                f.write(encoded)
+                offsets[i + 1] = offsets[i] + len(encoded)
+
+        dictionaries, codes = {}, {"text_offsets": offsets}
+        for name in ItemSnapshot.DICT_COLUMNS:
+            values = list(snapshot.dictionaries[name]) if snapshot is not None else []
+            lookup = {value: code for code, value in enumerate(values)}
+            column = np.empty(total, dtype=np.int32)
+            if snapshot is not None:
+                column[:kept] = snapshot.codes[name]
+            for i, item in enumerate(new_items, start=kept):
+                value = getattr(item, name)
+                if value is None:
+                    column[i] = -1
+                    continue
+                if value not in lookup:
+                    lookup[value] = len(values)
+                    values.append(value)
+                column[i] = lookup[value]
+            dictionaries[name] = values
+            codes[name] = column
+        np.savez(staging / "columns.npz", **codes)
+
+        meta = {"version": 1, "count": total, "dictionaries": dictionaries}
+        for name in ItemSnapshot.JSON_COLUMNS:
+            kept_column = snapshot.columns[name] if snapshot is not None else []
+            meta[name] = kept_column + [getattr(item, name) for item in new_items]
+        with open(staging / "items.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, default=str)
+
+        # Release the snapshot being replaced before swapping the new one into place
+        if snapshot is not None:
+            snapshot.close()
+        old = folder.with_name(folder.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        if folder.exists():
+            os.replace(folder, old)
+        os.replace(staging, folder)
+        shutil.rmtree(old, ignore_errors=True)
+
+        # Item ids are unchanged, so the inverted indexes stay valid
+        self.data = LazyItemList(ItemSnapshot(folder))
+
+    @classmethod
+    def load(cls, folder, **kwargs) -> "MemoryManager":
+        """Restore a snapshot written by save(); returns an empty manager if there is none.
+
+        Only the small columns are read up front. Item texts stay in texts.bin
+        (memory-mapped) until an item is accessed.
+        """
+        memory = cls(**kwargs)
+        folder = Path(folder)
+        if not (folder / "items.json").exists():
+            # Interrupted between the two renames in save()
+            old = folder.with_name(folder.name + ".old")
+            if not (old / "items.json").exists():
+                return memory
+            folder = old
+
+        snapshot = ItemSnapshot(folder)
+        if snapshot.count == 0:
+            snapshot.close()
+            return memory
+
+        memory.index = faiss.read_index(str(folder / "index.faiss"))
+        memory.data = LazyItemList(snapshot)
+        for idx in range(snapshot.count):
+            memory._index_item(
+                idx, snapshot.value("type", idx), snapshot.value("session_id", idx),
+                snapshot.columns["tags"][idx], snapshot.value("tool_name", idx),
+                snapshot.columns["tool_args"][idx],
+            )
+        return memory
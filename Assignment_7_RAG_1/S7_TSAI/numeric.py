@@ -0,0 +1,150 @@
+# numeric.py - size-guarded fibonacci, factorial and exp-sum for the calculator tools
+# Kept identical in Assignment_5 and Assignment_7_RAG_1/S7_TSAI: each calculator
+# server is run standalone from its own folder. Change both copies together.
+# Worker processes import it, so it must stay free of import-time side effects.
+
+import math
+import sys
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Largest integer result, in decimal digits, a tool may return. Python refuses to
+# convert bigger ints to str (and so to JSON) by default; where that limit is
+# disabled (0) or missing, the default limit of 4300 digits still applies.
+DEFAULT_INT_DIGITS = 4300
+MAX_INT_DIGITS = (sys.get_int_max_str_digits() if hasattr(sys, "get_int_max_str_digits") else 0) or DEFAULT_INT_DIGITS
+# Largest total number of digits in a list result
+MAX_OUTPUT_DIGITS = 1_000_000
+# Longest input list for the exp-sum
+MAX_EXP_SUM_TERMS = 1_000_000
+# Fibonacci numbers kept precomputed (0 disables the table); longer lists are
+# extended past the table from a fast-doubling seed
+FIB_TABLE_SIZE = 1000
+
+LOG10_PHI = math.log10((1 + math.sqrt(5)) / 2)
+LOG_FLOAT_MAX = math.log(sys.float_info.max)
+
+_fib_table: List[int] = []
+
+
+def _fib_digits(n: int) -> int:
+    """Decimal digits of F(n), up to rounding."""
+    return int(n * LOG10_PHI) + 1
+
+
+def _fibonacci_count_allowed(n: int) -> bool:
+    """Whether the first n Fibonacci numbers fit the output limits.
+
+    The last one, F(n-1), must fit MAX_INT_DIGITS; together (about
+    LOG10_PHI * n^2 / 2 digits) they must fit MAX_OUTPUT_DIGITS.
+    """
+    return _fib_digits(n - 1) <= MAX_INT_DIGITS and LOG10_PHI * n * n / 2 <= MAX_OUTPUT_DIGITS
+
+
+def _max_fibonacci_count() -> int:
+    n = 1
+    while _fibonacci_count_allowed(n + 1):
+        n += 1
+    return n
+
+
+# Longest list fibonacci_numbers returns
+MAX_FIBONACCI_COUNT = _max_fibonacci_count()
+
+
+def fibonacci_pair(n: int) -> Tuple[int, int]:
+    """(F(n), F(n+1)) by fast doubling, in O(log n) big-int multiplications."""
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        a, b = (d, c + d) if bit == "1" else (c, d)
+    return a, b
+
+
+def precompute_fibonacci(size: int = FIB_TABLE_SIZE):
+    """Fill the table of the first size Fibonacci numbers."""
+    global _fib_table
+    size = min(size, MAX_FIBONACCI_COUNT)  # entries past the limit could never be returned
+    table = [0, 1][:size]
+    while len(table) < size:
+        table.append(table[-1] + table[-2])
+    _fib_table = table
+
+
+def fibonacci_numbers(n: int) -> List[int]:
+    """The first n Fibonacci numbers."""
+    if n <= 0:
+        return []
+    if n > MAX_FIBONACCI_COUNT:
+        raise ValueError(f"the first {n} Fibonacci numbers exceed the output limit "
+                         f"(at most {MAX_FIBONACCI_COUNT} numbers)")
+    if not _fib_table and FIB_TABLE_SIZE:
+        precompute_fibonacci()
+    if n <= len(_fib_table):
+        return _fib_table[:n]
+
+    # Extend past the table, seeding from fast doubling
+    sequence = list(_fib_table)
+    a, b = fibonacci_pair(len(sequence))
+    while len(sequence) < n:
+        sequence.append(a)
+        a, b = b, a + b
+    return sequence
+
+
+def factorial(n: int) -> int:
+    """n!, refusing results longer than MAX_INT_DIGITS digits before computing them."""
+    if n < 0:
+        raise ValueError("factorial is not defined for negative values")
+    digits = math.floor(math.lgamma(n + 1) / math.log(10)) + 1
+    if digits > MAX_INT_DIGITS:
+        raise ValueError(f"{n}! has about {digits} digits, more than the limit of {MAX_INT_DIGITS}")
+    return math.factorial(n)
+
+
+def power(a: int, b: int) -> int:
+    """int(a ** b), refusing results longer than MAX_INT_DIGITS digits before computing them."""
+    if b > 0 and abs(a) > 1:
+        digits = math.floor(b * math.log10(abs(a))) + 1
+        if digits > MAX_INT_DIGITS:
+            raise ValueError(f"{a}**{b} has about {digits} digits, more than the limit of {MAX_INT_DIGITS}")
+    return int(a ** b)
+
+
+def _scaled_exp_sum(values: Sequence[float]) -> Tuple[float, float]:
+    """(m, s) with sum(exp(v)) == exp(m) * s and 1 <= s <= len(values)."""
+    if len(values) > MAX_EXP_SUM_TERMS:
+        raise ValueError(f"more than {MAX_EXP_SUM_TERMS} terms")
+    if len(values) == 0:
+        return -math.inf, 0.0
+    x = np.asarray([float(v) for v in values], dtype=np.float64)
+    m = float(x.max())
+    if math.isinf(m):
+        return m, 1.0
+    return m, math.fsum(np.exp(x - m))
+
+
+def log_exp_sum(values: Sequence[float]) -> float:
+    """log(sum(exp(v))), computed without overflow (log-sum-exp)."""
+    m, s = _scaled_exp_sum(values)
+    return m if s in (0.0, 1.0) else m + math.log(s)
+
+
+def exp_sum(values: Sequence[float]) -> float:
+    """sum(exp(v)); raises OverflowError (giving the log of the sum) if it exceeds the float range."""
+    m, s = _scaled_exp_sum(values)
+    if s == 0.0:
+        return 0.0
+    lse = m + math.log(s)
+    if lse > LOG_FLOAT_MAX:
+        raise OverflowError(f"sum of exponentials is e^{lse:.6f}, beyond the float range")
+    try:
+        result = math.exp(m) * s
+    except OverflowError:
+        # exp(m) alone overflows though the sum fits once scaled back
+        result = math.exp(lse)
+    if math.isinf(result):
+        raise OverflowError(f"sum of exponentials is e^{lse:.6f}, beyond the float range")
+    return result
@@ -0,0 +1,95 @@
+# offload.py - run CPU-bound tool work in a process pool
+# Kept identical in Assignment_5 and Assignment_7_RAG_1/S7_TSAI: each calculator
+# server is run standalone from its own folder. Change both copies together.
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ProcessOffloader:
+    """Runs CPU-bound tool calls in worker processes so the server's event loop
+    keeps serving other requests while they compute.
+
+    Every call has a timeout. A call that times out or is cancelled while it is
+    still queued is simply dropped; one that is already running cannot be
+    interrupted inside a worker, so the pool is torn down (its workers killed)
+    and a fresh one is started on the next call. Other calls running in that
+    pool at the time fail with BrokenProcessPool.
+
+    fn and its arguments are sent to the workers by pickle, so fn must be a
+    module-level function of an importable module.
+    """
+
+    def __init__(self, max_workers: int = None, timeout: float = 30.0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self.calls = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.restarts = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def _restart(self, pool: ProcessPoolExecutor):
+        """Kill the workers of pool and let the next call start a new one."""
+        with self._lock:
+            if self._pool is not pool:
+                return  # already replaced
+            self._pool = None
+            self.restarts += 1
+        # The executor has no public way to stop a task that is already running
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    async def run(self, fn, *args, timeout: float = None):
+        """Run fn(*args) in a worker process and return its result.
+
+        Raises TimeoutError if it takes longer than timeout seconds (default: self.timeout).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        pool = self._get_pool()
+        future = pool.submit(fn, *args)
+        self.calls += 1
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if not future.cancel():
+                self._restart(pool)
+            raise TimeoutError(f"{fn.__name__} did not finish within {timeout} seconds")
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            if not future.cancel():
+                self._restart(pool)
+            raise
+        except BrokenProcessPool:
+            # A worker died (or the pool was torn down for another call)
+            self._restart(pool)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "timeout": self.timeout,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "restarts": self.restarts,
+        }
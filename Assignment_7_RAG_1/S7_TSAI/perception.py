@@ -1,9 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional, List
-import os
-from dotenv import load_dotenv
-from google import genai
+from typing import Any, Optional, List
 import re
+from llm import generate
 
 # Optional: import log from agent if shared, else define locally
 try:
@@ -14,10 +12,6 @@ except ImportError:
         now = datetime.datetime.now().strftime("%H:%M:%S")
         print(f"[{now}] [{stage}] {msg}")
 
-load_dotenv()
-
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-
 
 class PerceptionResult(BaseModel):
     user_input: str
@@ -26,7 +20,21 @@ class PerceptionResult(BaseModel):
     tool_hint: Optional[str] = None
 
 
-def extract_perception(user_input: str) -> PerceptionResult:
+def parse_perception(user_input: str, parsed: dict) -> PerceptionResult:
+    """Build a PerceptionResult from the fields the LLM returned."""
+    entities = parsed.get("entities") or []
+    # Fix common issues
+    if isinstance(entities, dict):
+        entities = list(entities.values())
+    return PerceptionResult(
+        user_input=user_input,
+        intent=parsed.get("intent"),
+        entities=[str(e) for e in entities],
+        tool_hint=parsed.get("tool_hint")
+    )
+
+
+async def extract_perception(user_input: str) -> PerceptionResult:
     """Extracts intent, entities, and tool hints using LLM"""
 
     prompt = f"""
@@ -43,11 +51,7 @@ Output only the dictionary on a single line. Do NOT wrap it in ```json or other
     """
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
-        raw = response.text.strip()
+        raw = await generate(prompt)
         log("perception", f"LLM output: {raw}")
 
         # Strip Markdown backticks if present
@@ -59,13 +63,83 @@ Output only the dictionary on a single line. Do NOT wrap it in ```json or other
             log("perception", f"⚠️ Failed to parse cleaned output: {e}")
             raise
 
-        # Fix common issues
-        if isinstance(parsed.get("entities"), dict):
-            parsed["entities"] = list(parsed["entities"].values())
-
-
-        return PerceptionResult(user_input=user_input, **parsed)
+        return parse_perception(user_input, parsed)
 
     except Exception as e:
         log("perception", f"⚠️ Extraction failed: {e}")
         return PerceptionResult(user_input=user_input)
+
+
+class PerceptionCache:
+    """Keeps the perception of a multi-step task across agent steps.
+
+    From step two on, the agent input is the original task plus the previous
+    tool output, so intent and entities are extracted once and then updated
+    locally from each tool result instead of calling the LLM again.
+
+    Only the agent's separate perception/plan path uses it: when perception is
+    merged into the planning call there is no perception call left to skip.
+
+    The cached perception is dropped (and extracted again) when:
+    - the input no longer derives from the original task,
+    - the cached extraction failed (no intent),
+    - a tool call failed (MCP isError) or returned nothing,
+    - it has been reused max_reuse times (None = no limit).
+    """
+
+    MAX_ENTITIES = 20
+    MAX_ENTITY_LENGTH = 64
+
+    def __init__(self, query: str, max_reuse: Optional[int] = None):
+        self.query = query
+        self.max_reuse = max_reuse
+        self.perception: Optional[PerceptionResult] = None
+        self.reuses = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _derived(self, user_input: str) -> bool:
+        return user_input == self.query or user_input.startswith(f"Original task: {self.query}\n")
+
+    def get(self, user_input: str) -> Optional[PerceptionResult]:
+        """Return the cached perception adapted to user_input, or None if it must be extracted."""
+        if (
+            self.perception is None
+            or self.perception.intent is None
+            or not self._derived(user_input)
+            or (self.max_reuse is not None and self.reuses >= self.max_reuse)
+        ):
+            self.perception = None
+            self.misses += 1
+            return None
+        self.reuses += 1
+        self.hits += 1
+        return self.perception.model_copy(update={"user_input": user_input})
+
+    def put(self, perception: PerceptionResult):
+        """Store a freshly extracted perception."""
+        self.perception = perception
+        self.reuses = 0
+
+    def observe(self, tool_name: str, result: Any, is_error: bool = False):
+        """Fold a tool result into the cached perception, or invalidate it.
+
+        is_error is the tool call's structured failure flag (isError of the MCP result).
+        """
+        if self.perception is None:
+            return
+        values = result if isinstance(result, list) else [result]
+        if is_error or not values or all(str(v).strip() == "" for v in values):
+            self.perception = None
+            return
+
+        entities = list(self.perception.entities)
+        for value in values:
+            value = str(value).strip()
+            if len(value) <= self.MAX_ENTITY_LENGTH and value not in entities:
+                entities.append(value)
+        update = {"entities": entities[-self.MAX_ENTITIES:]}
+        # The hinted tool has been used; don't steer the planner back to it
+        if self.perception.tool_hint == tool_name:
+            update["tool_hint"] = None
+        self.perception = self.perception.model_copy(update=update)
@@ -0,0 +1,117 @@
+# tool_cache.py - memoization for pure MCP tools
+# Kept identical in Assignment_5 and Assignment_7_RAG_1/S7_TSAI: each calculator
+# server is run standalone from its own folder. Change both copies together.
+
+import functools
+import inspect
+import json
+import threading
+from collections import OrderedDict, defaultdict
+
+
+def canonical_args(fn, args, kwargs) -> str:
+    """Key for a call that does not depend on argument order or on passing defaults explicitly."""
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+
+    def canonical(value):
+        if hasattr(value, "model_dump"):
+            return canonical(value.model_dump())
+        if isinstance(value, dict):
+            return {str(k): canonical(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [canonical(v) for v in value]
+        return value
+
+    return json.dumps(canonical(bound.arguments), sort_keys=True, default=repr)
+
+
+class ToolResultCache:
+    """Bounded LRU of tool results, keyed by tool name and canonicalized arguments.
+
+    Only for tools whose result depends on nothing but their arguments.
+    Exceptions are not cached.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._tool_hits = defaultdict(int)
+        self._tool_misses = defaultdict(int)
+        # Names of the tools registered as pure
+        self.pure_tools = set()
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                self._tool_hits[key[0]] += 1
+                return True, self._results[key]
+            self.misses += 1
+            self._tool_misses[key[0]] += 1
+            return False, None
+
+    def _put(self, key, value):
+        with self._lock:
+            self._results[key] = value
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def memoize(self, fn):
+        """Wrap fn (sync or async) so repeated calls with equal arguments return the cached result."""
+        name = fn.__name__
+        self.pure_tools.add(name)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                key = (name, canonical_args(fn, args, kwargs))
+                found, value = self._get(key)
+                if found:
+                    return value
+                value = await fn(*args, **kwargs)
+                self._put(key, value)
+                return value
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (name, canonical_args(fn, args, kwargs))
+            found, value = self._get(key)
+            if found:
+                return value
+            value = fn(*args, **kwargs)
+            self._put(key, value)
+            return value
+        return wrapper
+
+    def tool(self, mcp, *args, **kwargs):
+        """Like @mcp.tool(), for a pure tool: registers the memoized function."""
+        def decorator(fn):
+            return mcp.tool(*args, **kwargs)(self.memoize(fn))
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._results),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "pure_tools": sorted(self.pure_tools),
+                "tools": {
+                    tool: {"hits": self._tool_hits[tool], "misses": self._tool_misses[tool]}
+                    for tool in sorted(set(self._tool_hits) | set(self._tool_misses))
+                },
+            }
@@ -0,0 +1,144 @@
+# tracing.py - per-stage latency spans for the agent loop
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attrs: dict):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.thread_id = threading.get_ident()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            "name": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "counters": dict(self.counters),
+        }
+
+
+class Tracer:
+    """Collects nested spans with wall time and counters (LLM tokens, embedding calls).
+
+    Counters recorded inside a span are rolled up into its parents when it
+    closes, so a step span carries the totals of all its stages.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+        self.spans: List[Span] = []
+        self.origin = time.perf_counter()
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+            self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        parent = self._current.get()
+        span = Span(name, parent, attrs)
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            self._current.reset(token)
+            if parent is not None:
+                for key, value in span.counters.items():
+                    parent.counters[key] += value
+            with self._lock:
+                self.spans.append(span)
+
+    def add(self, **counters):
+        """Add to counters of the active span; a no-op outside any span."""
+        span = self._current.get()
+        if span is None:
+            return
+        for key, value in counters.items():
+            if value:
+                span.counters[key] += value
+
+    def summary(self) -> Dict[str, dict]:
+        """Per span name: count, total/mean/max wall time and summed counters."""
+        with self._lock:
+            spans = list(self.spans)
+        summary: Dict[str, dict] = {}
+        for span in spans:
+            entry = summary.setdefault(span.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "counters": defaultdict(float)})
+            entry["count"] += 1
+            entry["total_ms"] += span.duration_ms
+            entry["max_ms"] = max(entry["max_ms"], span.duration_ms)
+            for key, value in span.counters.items():
+                entry["counters"][key] += value
+        for entry in summary.values():
+            entry["mean_ms"] = round(entry["total_ms"] / entry["count"], 3)
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["max_ms"] = round(entry["max_ms"], 3)
+            entry["counters"] = dict(entry["counters"])
+        return summary
+
+    def to_json(self, path: str):
+        """Write the spans (in start order) and the summary as plain JSON."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        data = {"spans": [s.to_dict(self.origin) for s in spans], "summary": self.summary()}
+        _write_json(path, data)
+
+    def to_chrome_trace(self, path: str):
+        """Write the spans in Chrome trace event format (chrome://tracing, Perfetto)."""
+        with self._lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        events = [
+            {
+                "name": s.name,
+                "ph": "X",
+                "ts": round((s.start - self.origin) * 1e6, 1),
+                "dur": round(s.duration_ms * 1000, 1),
+                "pid": pid,
+                "tid": s.thread_id,
+                "args": {**s.attrs, **s.counters},
+            }
+            for s in spans
+        ]
+        _write_json(path, {"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+def _write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, default=str)
+
+
+def record_llm_usage(response):
+    """Add the token counts of a Gemini response to the active span."""
+    usage = getattr(response, "usage_metadata", None)
+    tracer.add(
+        llm_calls=1,
+        prompt_tokens=getattr(usage, "prompt_token_count", None) or 0,
+        output_tokens=getattr(usage, "candidates_token_count", None) or 0,
+    )
+
+
+tracer = Tracer()
@@ -8,78 +8,125 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, "../.."))
 sys.path.append(project_root)
 
-from typing import List, Dict, Any, Tuple
+import time
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 from langchain_core.messages import ToolMessage, AIMessage
 
 
+async def invoke_tool_call(tool_call: Dict, tool_dict: Dict[str, Any]) -> AIMessage:
+    """
+    Invoke a single tool call and wrap its output in a message.
+    Handles schema validation and nested argument structures.
+
+    Args:
+        tool_call: A tool call from the LLM response.
+        tool_dict: Mapping of tool name to tool.
+
+    Returns:
+        A ToolMessage if the tool is unknown, otherwise an AIMessage with the output.
+    """
+    tool_name = tool_call.get("name")
+    tool_id = tool_call.get("id")
+    tool_args = tool_call.get("args", {})
+
+    if tool_name not in tool_dict:
+        return ToolMessage(content=f"Tool {tool_name} not found.", tool_call_id=tool_id)
+
+    selected_tool = tool_dict[tool_name]
+
+    # The MCP tool expects arguments in an "input_data" structure
+    if isinstance(tool_args, dict):
+        # Structure args correctly for MCP tools
+        if "input_data" not in tool_args:
+            # Wrap args in input_data if not already present
+            args_to_use = {"input_data": tool_args}
+        else:
+            args_to_use = tool_args
+
+        # Use correct invocation method based on tool type
+        if hasattr(selected_tool, "ainvoke"):
+            tool_output = await selected_tool.ainvoke(input=args_to_use)
+        else:
+            tool_output = selected_tool.invoke(input=args_to_use)
+    else:
+        # Handle non-dict case
+        if hasattr(selected_tool, "ainvoke"):
+            tool_output = await selected_tool.ainvoke(tool_args)
+        else:
+            tool_output = selected_tool.invoke(tool_args)
+    return AIMessage(content=tool_output)
+
+
+# Per-call tool timeout in seconds, matching tool_timeout in client/config.yaml
+DEFAULT_TOOL_TIMEOUT = 60.0
+
+
 async def process_tool_calls(
-    tool_calls: List[Dict], tools: List[Any]
+    tool_calls: List[Dict],
+    tools: List[Any],
+    max_concurrency: int = 4,
+    timeout: Optional[float] = DEFAULT_TOOL_TIMEOUT,
+    timings: Optional[List[Dict]] = None,
 ) -> List[AIMessage]:
     """
     Process tool calls by invoking the appropriate tool with arguments.
-    Handles schema validation and nested argument structures.
+    Independent tool calls run concurrently; results keep the order of tool_calls.
 
     Args:
         tool_calls: List of tool calls from the LLM response.
         tools: List of available tools.
+        max_concurrency: Maximum number of tool calls running at once.
+        timeout: Per-call timeout in seconds (None disables it).
+        timings: Optional list that receives one timing dict per tool call.
 
     Returns:
         List of ToolMessage objects with the results.
     """
-    messages = []
     tool_dict = {tool.name: tool for tool in tools}
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    call_timings = [None] * len(tool_calls)
 
-    for tool_call in tool_calls:
+    async def run_one(i: int, tool_call: Dict):
         tool_name = tool_call.get("name")
-        tool_id = tool_call.get("id")
-        tool_args = tool_call.get("args", {})
-
-        if tool_name not in tool_dict:
-            messages.append(
-                ToolMessage(
-                    content=f"Tool {tool_name} not found.", tool_call_id=tool_id
+        async with semaphore:
+            start = time.perf_counter()
+            status = "completed"
+            try:
+                message = await asyncio.wait_for(
+                    invoke_tool_call(tool_call, tool_dict), timeout=timeout
                 )
-            )
-            continue
-
-        selected_tool = tool_dict[tool_name]
-
-        try:
-            # The MCP tool expects arguments in an "input_data" structure
-            if isinstance(tool_args, dict):
-                # Structure args correctly for MCP tools
-                if "input_data" not in tool_args:
-                    # Wrap args in input_data if not already present
-                    args_to_use = {"input_data": tool_args}
-                else:
-                    args_to_use = tool_args
-
-                # Use correct invocation method based on tool type
-                if hasattr(selected_tool, "ainvoke"):
-                    tool_output = await selected_tool.ainvoke(input=args_to_use)
-                else:
-                    tool_output = selected_tool.invoke(input=args_to_use)
-
-                messages.append(AIMessage(content=tool_output))
-            else:
-                # Handle non-dict case
-                if hasattr(selected_tool, "ainvoke"):
-                    tool_output = await selected_tool.ainvoke(tool_args)
-                else:
-                    tool_output = selected_tool.invoke(tool_args)
-                messages.append(AIMessage(content=tool_output))
-
-        except Exception as e:
-            error_msg = f"Error executing tool {tool_name}: {e}"
-            messages.append(AIMessage(content=error_msg))
-
-    return messages
+            except asyncio.TimeoutError:
+                status = "timeout"
+                message = AIMessage(
+                    content=f"Error executing tool {tool_name}: timed out after {timeout}s"
+                )
+            except Exception as e:
+                status = "failed"
+                message = AIMessage(content=f"Error executing tool {tool_name}: {e}")
+            call_timings[i] = {
+                "name": tool_name,
+                "status": status,
+                "seconds": round(time.perf_counter() - start, 4),
+            }
+            return message
+
+    messages = await asyncio.gather(
+        *(run_one(i, tool_call) for i, tool_call in enumerate(tool_calls))
+    )
+
+    if timings is not None:
+        timings.extend(call_timings)
+    return list(messages)
 
 
 async def execute_actions(
     response: Any,
     messages: List[Any],
     tools: List[Any],
+    max_concurrency: int = 4,
+    tool_timeout: Optional[float] = DEFAULT_TOOL_TIMEOUT,
+    timings: Optional[List[Dict]] = None,
 ) -> Tuple[Any, List[Any]]:
     """Execute any tool calls in the response and update the message chain.
 
@@ -87,7 +134,9 @@ async def execute_actions(
         response: The LLM response
         messages: The existing message chain
         tools: The available tools
-        llm: Optional LLM instance (not used in this simplified version)
+        max_concurrency: Maximum number of tool calls running at once
+        tool_timeout: Per-call timeout in seconds (None disables it)
+        timings: Optional list that receives one timing dict per tool call
 
     Returns:
         Updated tuple of (response, messages)
@@ -98,7 +147,13 @@ async def execute_actions(
             # Handle tool calls
             print(f"Processing {len(response.tool_calls)} tool call(s)...")
 
-            tool_messages = await process_tool_calls(response.tool_calls, tools)
+            tool_messages = await process_tool_calls(
+                response.tool_calls,
+                tools,
+                max_concurrency=max_concurrency,
+                timeout=tool_timeout,
+                timings=timings,
+            )
             messages.extend(tool_messages)
 
             # Summarize the tool executions
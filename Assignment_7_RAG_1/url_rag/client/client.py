@@ -28,8 +28,13 @@ try:
     # Import LLM provider first to ensure SSL patching happens before any other imports
     from url_rag.client.llm_provider import default_llm
     from url_rag.client.decision import get_llm_decision
-    from url_rag.client.action import execute_actions, print_message_chain
-    from url_rag.client.memory import ConversationMemory
+    from url_rag.client.action import (
+        execute_actions,
+        print_message_chain,
+        DEFAULT_TOOL_TIMEOUT,
+    )
+    from url_rag.client.memory import ConversationMemory, SegmentConversationMemory
+    from url_rag.client.session_pool import MCPSessionPool
 
     # Import utility functions
     from url_rag.client.utils import (
@@ -63,11 +68,15 @@ OUTPUT_DIR = os.path.join(os.getcwd(), "url_rag", "conversation_logs")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
+# Client settings, next to this file so they load regardless of the working directory
+CONFIG_PATH = os.path.join(current_dir, "config.yaml")
+
+
 # Load config with smart defaults
 def load_config():
     config = {}
     try:
-        config = read_yaml_file("url_rag/utility/config.yaml")
+        config = read_yaml_file(CONFIG_PATH) or {}
         if config:
             log(f"Config loaded: {config}")
         else:
@@ -90,6 +99,9 @@ def load_config():
     return config
 
 
+# Values accepted for the history_storage setting
+HISTORY_STORAGES = ("faiss", "segments")
+
 # Load config once at startup
 config = load_config()
 print(f"Config: {config}")
@@ -99,10 +111,32 @@ memory_store = None
 if embedder:
     try:
         reset_index = config.get("reset_index", False)
-        memory_store = ConversationMemory(
-            embedder, index_folder=config["history_index_name"], reset_index=reset_index
+        history_storage = config.get("history_storage", "faiss")
+        if history_storage not in HISTORY_STORAGES:
+            raise ValueError(
+                f"Unknown history_storage {history_storage!r}, expected one of {HISTORY_STORAGES}"
+            )
+        if history_storage == "segments":
+            # Append-only segment log instead of the pickled FAISS docstore
+            memory_store = SegmentConversationMemory(
+                embedder,
+                index_folder=config["history_index_name"],
+                reset_index=reset_index,
+                max_segment_records=config.get("history_segment_records", 1000),
+                compact_threshold=config.get("history_compact_threshold", 4),
+            )
+        else:
+            memory_store = ConversationMemory(
+                embedder,
+                index_folder=config["history_index_name"],
+                reset_index=reset_index,
+                write_behind=config.get("history_write_behind", True),
+                flush_every=config.get("history_flush_every", 20),
+                flush_interval=config.get("history_flush_interval", 30.0),
+            )
+        log(
+            f"Memory store ({history_storage}) initialized with index: {config['history_index_name']}"
         )
-        log(f"Memory store initialized with index: {config['history_index_name']}")
     except Exception as e:
         log(f"Error initializing memory store: {e}")
 else:
@@ -154,8 +188,88 @@ async def process_step(step_name, outputs, func, *args, **kwargs):
         raise
 
 
-async def main(query: str, conversation_id=None, chat_history=None):
-    """Main function that coordinates the decision making and action layers for a single query."""
+async def answer_query(session, tools, query, conversation_id, chat_history, step_outputs):
+    """Run the decision and action layers for one query on an initialized session."""
+    # Get LLM decision
+    try:
+        response, messages = await process_step(
+            "Getting LLM decision",
+            step_outputs,
+            get_llm_decision,
+            session=session,
+            query=query,
+            tools=tools,
+            llm=llm,
+            chat_history=chat_history,
+            speculative=config.get("speculative_decision", True),
+        )
+    except Exception as e:
+        # Handle error in LLM decision and return early
+        error_msg = AIMessage(
+            content=f"I'm sorry, but I encountered an error processing your request: {str(e)}"
+        )
+        return (
+            f"Error: {str(e)}",
+            [HumanMessage(content=query), error_msg],
+            step_outputs,
+        )
+
+    # Execute tool calls if present
+    has_tool_calls = hasattr(response, "tool_calls") and response.tool_calls
+    step_name = "Executing tool calls" if has_tool_calls else "Processing response"
+
+    tool_timings = []
+    response, messages = await process_step(
+        step_name,
+        step_outputs,
+        execute_actions,
+        response=response,
+        messages=messages,
+        tools=tools,
+        max_concurrency=config.get("tool_concurrency", 4),
+        tool_timeout=config.get("tool_timeout", DEFAULT_TOOL_TIMEOUT),
+        timings=tool_timings,
+    )
+
+    if has_tool_calls:
+        step_outputs["steps"][-1]["tools_used"] = [
+            tc["name"] for tc in response.tool_calls
+        ]
+        step_outputs["steps"][-1]["tool_timings"] = tool_timings
+
+    # Print the final message chain
+    log("Conversation results:")
+    print_message_chain(messages)
+
+    # Save conversation
+    save_conversation(conversation_id, query, messages, OUTPUT_DIR)
+    step_outputs["steps"].append({"name": "Saving conversation", "status": "completed"})
+
+    # Store in memory if available
+    if memory_store:
+        memory_messages = convert_messages_to_memory_format(messages)
+        if memory_messages:
+            log(f"Storing {len(memory_messages)} messages in memory")
+            memory_store.store_conversation(conversation_id, memory_messages)
+            step_outputs["steps"].append(
+                {
+                    "name": "Storing in memory",
+                    "status": "completed",
+                    "message_count": len(memory_messages),
+                }
+            )
+
+    return response, messages, step_outputs
+
+
+async def main(
+    query: str, conversation_id=None, chat_history=None, session_pool=None
+):
+    """Main function that coordinates the decision making and action layers for a single query.
+
+    When a session_pool is given, a warm session and its cached tools are
+    borrowed from it; otherwise a new server process is started for the query.
+    """
     # Generate a conversation ID if none provided
     if conversation_id is None:
         conversation_id = uuid.uuid4().hex
@@ -189,6 +303,22 @@ async def main(query: str, conversation_id=None, chat_history=None):
     }
 
     try:
+        if session_pool is not None:
+            # Reuse a warm session from the pool
+            async with session_pool.session() as (session, tools):
+                step_outputs["steps"].append(
+                    {
+                        "name": "Loading tools",
+                        "status": "completed",
+                        "tools_count": len(tools),
+                        "cached": True,
+                    }
+                )
+                log(f"Using pooled session with {len(tools)} cached tools")
+                return await answer_query(
+                    session, tools, query, conversation_id, chat_history, step_outputs
+                )
+
         # Connect to the MCP server
         async with stdio_client(server_params) as (read, write):
             log("Connection established")
@@ -204,77 +334,10 @@ async def main(query: str, conversation_id=None, chat_history=None):
                 step_outputs["steps"][-1]["tools_count"] = len(tools)
                 log(f"Loaded {len(tools)} tools")
 
-                # Get LLM decision
-                try:
-                    response, messages = await process_step(
-                        "Getting LLM decision",
-                        step_outputs,
-                        get_llm_decision,
-                        session=session,
-                        query=query,
-                        tools=tools,
-                        llm=llm,
-                        chat_history=chat_history,
-                    )
-                except Exception as e:
-                    # Handle error in LLM decision and return early
-                    error_msg = AIMessage(
-                        content=f"I'm sorry, but I encountered an error processing your request: {str(e)}"
-                    )
-                    return (
-                        f"Error: {str(e)}",
-                        [HumanMessage(content=query), error_msg],
-                        step_outputs,
-                    )
-
-                # Execute tool calls if present
-                has_tool_calls = hasattr(response, "tool_calls") and response.tool_calls
-                step_name = (
-                    "Executing tool calls" if has_tool_calls else "Processing response"
-                )
-
-                response, messages = await process_step(
-                    step_name,
-                    step_outputs,
-                    execute_actions,
-                    response=response,
-                    messages=messages,
-                    tools=tools,
-                )
-
-                if has_tool_calls:
-                    step_outputs["steps"][-1]["tools_used"] = [
-                        tc["name"] for tc in response.tool_calls
-                    ]
-
-                # Print the final message chain
-                log("Conversation results:")
-                print_message_chain(messages)
-
-                # Save conversation
-                save_conversation(conversation_id, query, messages, OUTPUT_DIR)
-                step_outputs["steps"].append(
-                    {"name": "Saving conversation", "status": "completed"}
+                return await answer_query(
+                    session, tools, query, conversation_id, chat_history, step_outputs
                 )
 
-                # Store in memory if available
-                if memory_store:
-                    memory_messages = convert_messages_to_memory_format(messages)
-                    if memory_messages:
-                        log(f"Storing {len(memory_messages)} messages in memory")
-                        memory_store.store_conversation(
-                            conversation_id, memory_messages
-                        )
-                        step_outputs["steps"].append(
-                            {
-                                "name": "Storing in memory",
-                                "status": "completed",
-                                "message_count": len(memory_messages),
-                            }
-                        )
-
-                return response, messages, step_outputs
-
     except Exception as e:
         # Handle any uncaught exceptions
         log(f"Error occurred in main: {e}")
@@ -325,43 +388,55 @@ async def run_conversation():
     results = []
     chat_history = []  # Initialize empty chat history
 
-    for i, query in enumerate(queries, 1):
-        print("\n" + "=" * 50)
-        print(f"QUERY {i}/{len(queries)}: {query}")
-        print("=" * 50 + "\n")
+    # Keep warm server sessions alive for the whole conversation
+    async with MCPSessionPool(
+        server_params, size=config.get("session_pool_size", 1)
+    ) as session_pool:
+        for i, query in enumerate(queries, 1):
+            print("\n" + "=" * 50)
+            print(f"QUERY {i}/{len(queries)}: {query}")
+            print("=" * 50 + "\n")
+
+            # Run the main function with the current query and accumulated chat history
+            response, messages, step_outputs = await main(
+                query, conversation_id, chat_history, session_pool=session_pool
+            )
 
-        # Run the main function with the current query and accumulated chat history
-        response, messages, step_outputs = await main(
-            query, conversation_id, chat_history
-        )
+            # Update chat history for next query
+            chat_history = []  # Reset and get fresh from memory
+            if memory_store:
+                chat_history = memory_store.get_conversation_as_lc_messages(
+                    conversation_id
+                )
 
-        # Update chat history for next query
-        chat_history = []  # Reset and get fresh from memory
-        if memory_store:
-            chat_history = memory_store.get_conversation_as_lc_messages(conversation_id)
+            # Save results for summary
+            results.append(
+                {
+                    "conversation_id": conversation_id,
+                    "query": query,
+                    "response": response,
+                    "messages": messages,
+                    "step_outputs": step_outputs,
+                }
+            )
 
-        # Save results for summary
-        results.append(
-            {
-                "conversation_id": conversation_id,
-                "query": query,
-                "response": response,
-                "messages": messages,
-                "step_outputs": step_outputs,
-            }
-        )
+            # Print conversation summary
+            print_conversation_summary(
+                conversation_id, query, response, messages, step_outputs
+            )
+            print("\n" + "-" * 50 + "\n")
 
-        # Print conversation summary
-        print_conversation_summary(
-            conversation_id, query, response, messages, step_outputs
-        )
-        print("\n" + "-" * 50 + "\n")
+        log(f"Session pool stats: {session_pool.stats()}")
 
     log(f"Conversation session complete. Processed {len(queries)} queries.")
 
     # Save session summary
     save_session_summary(conversation_id, queries, results, OUTPUT_DIR)
 
+    # Persist any history still held back by write-behind
+    if memory_store:
+        memory_store.flush()
+
     # Display full conversation history at the end
     if memory_store:
         print("\nFull conversation history from memory store:")
@@ -7,7 +7,9 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, "../.."))
 sys.path.append(project_root)
 
+import re
 import json
+import asyncio
 from typing import Optional, Tuple, Dict, Any, List
 
 from langchain_core.messages import HumanMessage, AIMessage
@@ -65,46 +67,134 @@ def explain_perception_result(perception_result: WebContentSearch) -> str:
     return explanation
 
 
-async def analyze_query(query: str, chat_history=None) -> Optional[str]:
-    """Analyze a user query with the perception chain.
+async def run_perception(query: str, chat_history=None) -> Optional[WebContentSearch]:
+    """Run the perception chain on a user query.
 
     Args:
         query: The user's query string
         chat_history: List of previous conversation messages
 
     Returns:
-        An explanation of the perception results, or None if perception failed
+        The WebContentSearch result, or None if perception is unavailable or failed
     """
-    # If perception is not available, return the original query
     if not PERCEPTION_AVAILABLE or perception_chain is None:
-        return query
+        return None
 
     # Initialize empty chat history if None
     if chat_history is None:
         chat_history = []
 
-    query_lower = query.lower()
-
     try:
         print("Processing query through perception chain...")
         perception_result = await perception_chain.ainvoke(
-            {"user_query": query_lower, "chat_history": chat_history}
+            {"user_query": query.lower(), "chat_history": chat_history}
         )
-
         print(f"The perception result is::: {perception_result.model_dump()}")
-
-        # Create explanation of perception results
-        print("Creating explanation of perception results...")
-        explanation = explain_perception_result(perception_result)
-
-        print(f"\nPerception explanation:\n{explanation}\n")
-        return explanation
-
+        return perception_result
     except Exception as e:
         print(f"Perception chain failed: {e}")
+        return None
+
+
+def perception_to_input(query: str, perception_result: Optional[WebContentSearch]) -> str:
+    """Build the model input from a perception result, falling back to the raw query."""
+    if perception_result is None:
         print("Falling back to original query")
         return query
 
+    # Create explanation of perception results
+    print("Creating explanation of perception results...")
+    explanation = explain_perception_result(perception_result)
+
+    print(f"\nPerception explanation:\n{explanation}\n")
+    return explanation
+
+
+async def analyze_query(query: str, chat_history=None) -> Optional[str]:
+    """Analyze a user query with the perception chain.
+
+    Args:
+        query: The user's query string
+        chat_history: List of previous conversation messages
+
+    Returns:
+        An explanation of the perception results, or the original query if perception failed
+    """
+    perception_result = await run_perception(query, chat_history)
+    return perception_to_input(query, perception_result)
+
+
+# Minimum word overlap between the raw and enhanced query for the speculative
+# tool call on the raw query to be kept
+SPECULATION_SIMILARITY_THRESHOLD = 0.8
+
+# Server tools taking a result count k, and the k they use when it is not given
+# (RetrieveDocumentsInput / BatchRetrieveDocumentsInput in server/models.py)
+SEARCH_TOOLS = {"web_search_tool", "batch_web_search_tool"}
+SEARCH_TOOL_DEFAULT_K = 3
+
+
+def _query_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the lowercased word sets of two queries."""
+    words_a = set(re.findall(r"\w+", a.lower()))
+    words_b = set(re.findall(r"\w+", b.lower()))
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def speculation_is_valid(
+    query: str, perception_result: Optional[WebContentSearch], response: Any
+) -> bool:
+    """Decide whether a tool call made on the raw query can stand in for one on the enhanced query.
+
+    The speculative response is kept when perception failed (the raw query would
+    have been used anyway), or when the enhanced query is materially the same as
+    the raw one and the result count of every speculative search call (the
+    tool default when k is unset) matches the one perception asked for.
+    """
+    if perception_result is None:
+        return True
+
+    similarity = _query_similarity(query, perception_result.enhanced_user_query)
+    print(f"Raw/enhanced query similarity: {similarity:.2f}")
+    if similarity < SPECULATION_SIMILARITY_THRESHOLD:
+        return False
+
+    for tc in getattr(response, "tool_calls", None) or []:
+        if not isinstance(tc, dict) or tc.get("name") not in SEARCH_TOOLS:
+            continue
+        args = tc.get("args") or {}
+        args = args.get("input_data", args) if isinstance(args, dict) else {}
+        # A call that leaves k unset gets the tool's default number of results
+        k = args.get("k", SEARCH_TOOL_DEFAULT_K) if isinstance(args, dict) else SEARCH_TOOL_DEFAULT_K
+        if k != perception_result.no_of_results:
+            return False
+    return True
+
+
+async def speculative_invoke(llm_with_tools, query: str, chat_history=None) -> Any:
+    """Run tool selection on the raw query while perception runs.
+
+    The speculative response is returned if the perception result shows it is
+    still valid; otherwise the model is invoked again on the enhanced query.
+    """
+    speculative_task = asyncio.create_task(llm_with_tools.ainvoke(query))
+    perception_result = await run_perception(query, chat_history)
+
+    try:
+        response = await speculative_task
+    except Exception as e:
+        print(f"Speculative invocation failed: {e}")
+        response = None
+
+    if response is not None and speculation_is_valid(query, perception_result, response):
+        print("Keeping speculative tool selection")
+        return response
+
+    print("Discarding speculative tool selection, invoking model on enhanced query...")
+    return await llm_with_tools.ainvoke(perception_to_input(query, perception_result))
+
 
 async def get_llm_decision(
     session: ClientSession,
@@ -112,6 +202,7 @@ async def get_llm_decision(
     tools: Optional[List[Any]] = None,
     llm: Optional[Any] = None,
     chat_history: Optional[List[Dict]] = None,
+    speculative: bool = False,
 ) -> Tuple[Any, List[Dict]]:
     """Get a decision from the LLM based on the query and perception explanation.
 
@@ -121,6 +212,8 @@ async def get_llm_decision(
         tools: Optional list of pre-loaded tools
         llm: Optional LLM instance to use instead of the default
         chat_history: Optional list of previous conversation messages
+        speculative: Start tool selection on the raw query while perception runs,
+            and only re-invoke the model if the enhanced query materially differs
 
     Returns:
         Tuple of (LLM response, message chain)
@@ -138,15 +231,19 @@ async def get_llm_decision(
         print("Binding tools to model...")
         llm_with_tools = model.bind_tools(tools)
 
-        # Get enhanced query or fall back to original
-        enhanced_query = await analyze_query(query, chat_history)
+        if speculative:
+            print("Invoking model speculatively alongside perception...")
+            response = await speculative_invoke(llm_with_tools, query, chat_history)
+        else:
+            # Get enhanced query or fall back to original
+            enhanced_query = await analyze_query(query, chat_history)
 
-        # If enhanced_query is None, use the original query
-        input_query = enhanced_query if enhanced_query is not None else query
+            # If enhanced_query is None, use the original query
+            input_query = enhanced_query if enhanced_query is not None else query
 
-        # Process query
-        print("Invoking model...")
-        response = await llm_with_tools.ainvoke(input_query)
+            # Process query
+            print("Invoking model...")
+            response = await llm_with_tools.ainvoke(input_query)
 
         # print(f"The response is::: {response}")
         # Build initial message chain - this is the message chain that will be used to build the action chain
@@ -1,16 +1,220 @@
 from langchain_ollama import OllamaEmbeddings
 import os
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Default location of the on-disk embedding cache, overridable per provider
+DEFAULT_EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(".embedding_cache", "embeddings.sqlite")
+)
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embedding vectors keyed by (model_name, sha256(text)).
+
+    The front tier is an in-memory LRU of at most max_memory_items vectors, held
+    as float32 arrays (a list of Python floats would take about 8x the memory).
+    The back tier is a SQLite table of float32 blobs; when it grows past
+    max_disk_bytes the least recently used rows are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_EMBEDDING_CACHE_PATH,
+        max_memory_items: int = 10000,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+        )
+        self._db.commit()
+        self._disk_bytes = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    @staticmethod
+    def key(model_name: str, text: str) -> tuple:
+        return model_name, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: tuple, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model_name: str, texts: list) -> list:
+        """Return the cached vector for each text, or None where it is not cached."""
+        keys = [self.key(model_name, text) for text in texts]
+        results = [None] * len(texts)
+        with self._lock:
+            missing = []
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[i] = vector.tolist()
+                else:
+                    missing.append(i)
+
+            now = time.time()
+            for i in missing:
+                model, text_hash = keys[i]
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?",
+                    (model, text_hash),
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    continue
+                vector = np.frombuffer(row[0], dtype=np.float32)
+                self._db.execute(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    (now, model, text_hash),
+                )
+                self._remember(keys[i], vector)
+                self.disk_hits += 1
+                results[i] = vector.tolist()
+            if missing:
+                self._db.commit()
+        return results
+
+    def put_many(self, model_name: str, texts: list, vectors: list) -> None:
+        """Store the vectors for the given texts in both tiers."""
+        now = time.time()
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(model_name, text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                blob = vector.tobytes()
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_access)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key[0], key[1], blob, now),
+                )
+                if cursor.rowcount:
+                    self._disk_bytes += len(blob)
+            self._db.commit()
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used rows until the disk tier is at 90% of its limit."""
+        target = int(self.max_disk_bytes * 0.9)
+        rows = self._db.execute(
+            "SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_access"
+        )
+        to_delete = []
+        for model, text_hash, size in rows:
+            if self._disk_bytes <= target:
+                break
+            to_delete.append((model, text_hash))
+            self._disk_bytes -= size
+        self._db.executemany(
+            "DELETE FROM embeddings WHERE model = ? AND text_hash = ?", to_delete
+        )
+        self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that serves repeated texts from an EmbeddingCache
+    and sends only the misses to the wrapped embeddings, in a single batch.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts: list) -> list:
+        vectors = self.cache.get_many(self.model_name, texts)
+        # Embed each distinct missing text once
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            new_vectors = self.embeddings.embed_documents(missing)
+            self.cache.put_many(self.model_name, missing, new_vectors)
+            computed = dict(zip(missing, new_vectors))
+            vectors = [
+                v if v is not None else list(computed[t]) for t, v in zip(texts, vectors)
+            ]
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        vector = self.cache.get_many(self.model_name, [text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(self.model_name, [text], [vector])
+        return vector
+
+
+_shared_caches = {}
+
+
+def get_embedding_cache(path: str = DEFAULT_EMBEDDING_CACHE_PATH) -> EmbeddingCache:
+    """Return the process-wide EmbeddingCache for a path, creating it on first use."""
+    path = os.path.abspath(path)
+    if path not in _shared_caches:
+        _shared_caches[path] = EmbeddingCache(path)
+    return _shared_caches[path]
+
 
 class OllamaEmbeddingProvider:
-    def __init__(self, model_name: str = "nomic-embed-text:latest"):
+    def __init__(
+        self,
+        model_name: str = "nomic-embed-text:latest",
+        cache_path: str = DEFAULT_EMBEDDING_CACHE_PATH,
+        use_cache: bool = True,
+    ):
         self.model_name = model_name
         self.embeddings = OllamaEmbeddings(model=self.model_name)
+        if use_cache:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings, f"ollama/{self.model_name}", get_embedding_cache(cache_path)
+            )
 
     def embed_query(self, text: str):
         """
@@ -31,6 +235,8 @@ class OpenAIEmbeddingProvider:
         model_name: str = "text-embedding-3-small",
         api_key: str = None,
         verify_ssl: bool = False,
+        cache_path: str = DEFAULT_EMBEDDING_CACHE_PATH,
+        use_cache: bool = True,
     ):
         self.model_name = model_name
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
@@ -49,6 +255,10 @@ class OpenAIEmbeddingProvider:
             openai_api_key=self.api_key,
             http_client=self.http_client,
         )
+        if use_cache:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings, f"openai/{self.model_name}", get_embedding_cache(cache_path)
+            )
 
     def embed_query(self, text: str):
         return self.embeddings.embed_query(text)
@@ -1,10 +1,16 @@
 
 from langchain_core.documents import Document
 import os
+import json
+import atexit
+import hashlib
+import shutil
+import threading
 from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.in_memory import InMemoryDocstore
 import faiss
 from utils import check_and_reset_index
+from segment_log import SegmentLog
 from dotenv import load_dotenv
 import sys
 
@@ -22,18 +28,175 @@ if "SSL_CERT_FILE" in os.environ:
     del os.environ["SSL_CERT_FILE"]
 
 
+def to_lc_messages(messages) -> list:
+    """Convert (sender, content) pairs to LangChain-style role/content dicts."""
+    lc_messages = []
+    for sender, content in messages:
+        sender = sender.lower()
+        if sender in ("human", "ai", "tool"):
+            lc_messages.append({"role": sender, "content": content})
+        else:
+            # fallback: treat as human
+            lc_messages.append({"role": "human", "content": content})
+    return lc_messages
+
+
+class ConversationIndex:
+    """
+    Secondary index from conversation_id to its ordered message ids.
+
+    Kept in memory and persisted as JSON next to the FAISS index, so looking up
+    a conversation or appending to it never scans the whole docstore.
+    """
+
+    FILE_NAME = "conversation_index.json"
+
+    def __init__(self, index_folder):
+        self.path = os.path.join(index_folder, self.FILE_NAME)
+        # conversation_id -> {"ids": [message ids in order], "next_order": int}
+        self.conversations = {}
+
+    def load(self, docstore_ids) -> bool:
+        """
+        Load the index from disk, rebuilding it from the docstore ids when the
+        file is missing or was not saved with the same set of docstore ids.
+
+        Returns:
+            True if the index was rebuilt and should be saved
+        """
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("ids_hash") == self.ids_hash(docstore_ids):
+                self.conversations = saved["conversations"]
+                return False
+            print("Conversation index is out of date, rebuilding it")
+        self.rebuild(docstore_ids)
+        return True
+
+    @staticmethod
+    def ids_hash(ids) -> str:
+        """Order-independent digest of a set of message ids."""
+        digest = hashlib.sha256()
+        for doc_id in sorted(ids):
+            digest.update(doc_id.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def rebuild(self, docstore_ids) -> None:
+        """Rebuild the index with one pass over the docstore ids."""
+        orders = {}
+        for doc_id in docstore_ids:
+            conversation_id, _, order = doc_id.rpartition("_")
+            if conversation_id and order.isdigit():
+                orders.setdefault(conversation_id, []).append(int(order))
+        self.conversations = {
+            conversation_id: {
+                "ids": [f"{conversation_id}_{o}" for o in sorted(conv_orders)],
+                "next_order": max(conv_orders) + 1,
+            }
+            for conversation_id, conv_orders in orders.items()
+        }
+
+    def save(self, path: str = None) -> None:
+        """Write the index to disk atomically, by default to its own path."""
+        path = path or self.path
+        tmp_path = path + ".tmp"
+        ids = (doc_id for entry in self.conversations.values() for doc_id in entry["ids"])
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ids_hash": self.ids_hash(ids), "conversations": self.conversations}, f)
+        os.replace(tmp_path, path)
+
+    def reserve(self, conversation_id: str, count: int) -> tuple[int, list[str]]:
+        """
+        Allocate ids for count new messages in a conversation.
+
+        Returns:
+            Tuple of (first order number, list of new message ids)
+        """
+        entry = self.conversations.setdefault(
+            conversation_id, {"ids": [], "next_order": 0}
+        )
+        start_order = entry["next_order"]
+        ids = [f"{conversation_id}_{start_order + i}" for i in range(count)]
+        entry["ids"].extend(ids)
+        entry["next_order"] = start_order + count
+        return start_order, ids
+
+    def release(self, conversation_id: str, ids: list[str]) -> None:
+        """Undo a reserve() whose documents could not be stored."""
+        entry = self.conversations.get(conversation_id)
+        if entry is None:
+            return
+        del entry["ids"][len(entry["ids"]) - len(ids) :]
+        entry["next_order"] -= len(ids)
+        if not entry["ids"]:
+            del self.conversations[conversation_id]
+
+    def get_ids(self, conversation_id: str, last: int = None) -> list[str]:
+        """Return the ordered message ids of a conversation, optionally only the last few."""
+        entry = self.conversations.get(conversation_id)
+        if entry is None:
+            return []
+        ids = entry["ids"]
+        return ids[-last:] if last else list(ids)
+
+    def conversation_ids(self) -> list[str]:
+        return list(self.conversations.keys())
+
+    def message_count(self) -> int:
+        return sum(len(entry["ids"]) for entry in self.conversations.values())
+
+
 class ConversationMemory:
     """
     Store and retrieve conversations in a FAISS vector store using conversation IDs.
     Each message is a Document with metadata: conversation_id, sender ('human' or 'ai'), and order.
+    A ConversationIndex maps each conversation_id to its ordered message ids.
     """
 
-    def __init__(self, embedder, index_folder="history_index", reset_index=False):
+    # Number of messages returned when recency is requested
+    RECENT_MESSAGES = 6
+
+    # Staging folders used by the atomic save, created inside index_folder
+    STAGING_DIR = ".staging"
+    PENDING_DIR = ".pending"
+    INDEX_FILES = ("index.faiss", "index.pkl", ConversationIndex.FILE_NAME)
+
+    def __init__(
+        self,
+        embedder,
+        index_folder="history_index",
+        reset_index=False,
+        write_behind=True,
+        flush_every=20,
+        flush_interval=30.0,
+    ):
+        """
+        Args:
+            embedder: The embeddings used for the FAISS index
+            index_folder: Folder holding index.faiss, index.pkl and the conversation index
+            reset_index: Delete the existing index folder first
+            write_behind: Keep appends in memory and flush them later instead of
+                saving the whole index on every store_conversation call
+            flush_every: In write-behind mode, flush after this many appended messages
+            flush_interval: In write-behind mode, flush dirty state every this many
+                seconds (None disables the timer)
+        """
         self.embedder = embedder
         self.index_folder = index_folder
+        self.write_behind = write_behind
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._pending_messages = 0
+        self._stop_flusher = threading.Event()
+        self._flusher = None
+
         # Optionally reset the index folder
         check_and_reset_index(self.index_folder, reset_index)
-        if not os.path.exists(index_folder):
+        self._recover_interrupted_save()
+        if not os.path.exists(os.path.join(index_folder, "index.faiss")):
             sample_embedding = embedder.embed_query("sample text")
             index = faiss.IndexFlatL2(len(sample_embedding))
             self.vector_store = FAISS(
@@ -42,48 +205,137 @@ class ConversationMemory:
                 docstore=InMemoryDocstore(),
                 index_to_docstore_id={},
             )
-            self.vector_store.save_local(folder_path=index_folder)
+            is_new = True
         else:
             self.vector_store = FAISS.load_local(
                 index_folder, embedder, allow_dangerous_deserialization=True
             )
+            is_new = False
+        self.conversation_index = ConversationIndex(index_folder)
+        rebuilt = self.conversation_index.load(self.vector_store.docstore._dict.keys())
+        if is_new or rebuilt:
+            self._save()
+
+        if self.write_behind:
+            if self.flush_interval:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, name="history-flusher", daemon=True
+                )
+                self._flusher.start()
+            atexit.register(self.close)
+
+    def _recover_interrupted_save(self) -> None:
+        """
+        Finish or discard a save that was interrupted by a crash.
+
+        A complete snapshot is renamed to PENDING_DIR before its files are moved
+        into place, so a PENDING_DIR is rolled forward and a STAGING_DIR (an
+        incomplete snapshot) is discarded.
+        """
+        staging = os.path.join(self.index_folder, self.STAGING_DIR)
+        pending = os.path.join(self.index_folder, self.PENDING_DIR)
+        if os.path.exists(pending):
+            print("Completing an interrupted history index save")
+            self._install_snapshot(pending)
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+
+    def _install_snapshot(self, pending: str) -> None:
+        """Move every file of a complete snapshot into the index folder."""
+        for file_name in self.INDEX_FILES:
+            src = os.path.join(pending, file_name)
+            if os.path.exists(src):
+                os.replace(src, os.path.join(self.index_folder, file_name))
+        shutil.rmtree(pending)
+
+    def _save(self) -> None:
+        """
+        Atomically write the FAISS index, docstore and conversation index.
+
+        The files are written to a staging folder, which is renamed to mark the
+        snapshot complete, and then each file is renamed over the live one.
+        A crash at any point leaves either the old or the new snapshot on disk.
+        """
+        with self._lock:
+            os.makedirs(self.index_folder, exist_ok=True)
+            staging = os.path.join(self.index_folder, self.STAGING_DIR)
+            pending = os.path.join(self.index_folder, self.PENDING_DIR)
+            if os.path.exists(staging):
+                shutil.rmtree(staging)
+            self.vector_store.save_local(folder_path=staging)
+            self.conversation_index.save(
+                os.path.join(staging, ConversationIndex.FILE_NAME)
+            )
+            os.replace(staging, pending)
+            self._install_snapshot(pending)
+            self._pending_messages = 0
+
+    def flush(self) -> None:
+        """Persist any messages appended since the last save."""
+        with self._lock:
+            if self._pending_messages:
+                self._save()
+
+    def _flush_periodically(self) -> None:
+        while not self._stop_flusher.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing history index: {e}")
+
+    def close(self) -> None:
+        """Stop the background flusher and write out any dirty state."""
+        self._stop_flusher.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self.flush()
 
     def store_conversation(self, conversation_id: str, messages: list[dict]):
         """
         Incrementally store messages for a conversation.
         Each message is a dict: {'sender': 'human'/'ai', 'content': str}
+
+        In write-behind mode the index is only saved once flush_every messages
+        are pending, on the flush timer, or at shutdown.
         """
-        # Find the current max order for this conversation
-        existing_ids = [
-            k
-            for k in self.vector_store.docstore._dict.keys()
-            if k.startswith(conversation_id + "_")
-        ]
-        if existing_ids:
-            # Extract the order numbers and find the max
-            existing_orders = [
-                int(k.split("_")[-1])
-                for k in existing_ids
-                if k.split("_")[-1].isdigit()
-            ]
-            start_order = max(existing_orders) + 1 if existing_orders else 0
-        else:
-            start_order = 0
-
-        docs = [
-            Document(
-                page_content=msg["content"],
-                metadata={
-                    "conversation_id": conversation_id,
-                    "sender": msg["sender"],
-                    "order": start_order + i,
-                },
+        if not messages:
+            return
+        with self._lock:
+            start_order, ids = self.conversation_index.reserve(
+                conversation_id, len(messages)
             )
-            for i, msg in enumerate(messages)
-        ]
-        ids = [f"{conversation_id}_{start_order + i}" for i in range(len(messages))]
-        self.vector_store.add_documents(docs, ids=ids)
-        self.vector_store.save_local(folder_path=self.index_folder)
+
+            docs = [
+                Document(
+                    page_content=msg["content"],
+                    metadata={
+                        "conversation_id": conversation_id,
+                        "sender": msg["sender"],
+                        "order": start_order + i,
+                    },
+                )
+                for i, msg in enumerate(messages)
+            ]
+            try:
+                self.vector_store.add_documents(docs, ids=ids)
+            except Exception:
+                self.conversation_index.release(conversation_id, ids)
+                raise
+            self._pending_messages += len(messages)
+
+            if not self.write_behind or self._pending_messages >= self.flush_every:
+                self._save()
+
+    def _get_docs(self, conversation_id: str, recency: bool = False) -> list:
+        """Fetch the ordered documents of a conversation through the conversation index."""
+        ids = self.conversation_index.get_ids(
+            conversation_id, last=self.RECENT_MESSAGES if recency else None
+        )
+        if not ids:
+            return []
+        with self._lock:
+            docs = self.vector_store.get_by_ids(ids)
+        return [doc for doc in docs if doc is not None]
 
     def get_conversation(
         self, conversation_id: str, recency: bool = False
@@ -91,21 +343,7 @@ class ConversationMemory:
         """
         Retrieve the conversation as a list of dicts with sender and content, ordered.
         """
-        # Get all docstore keys for this conversation
-        ids = [
-            k
-            for k in self.vector_store.docstore._dict.keys()
-            if k.startswith(conversation_id + "_")
-        ]
-        docs = self.vector_store.get_by_ids(ids)
-        # Sort by order
-        docs = sorted(
-            [doc for doc in docs if doc is not None],
-            key=lambda d: d.metadata.get("order", 0),
-        )
-        if recency:
-            # pass only last 6 messages
-            docs = docs[-6:]
+        docs = self._get_docs(conversation_id, recency)
         return [
             {"sender": doc.metadata["sender"], "content": doc.page_content}
             for doc in docs
@@ -117,33 +355,10 @@ class ConversationMemory:
         """
         Return the conversation as a list of LangChain HumanMessage and AIMessage objects, ordered.
         """
-        # Get all docstore keys for this conversation
-        ids = [
-            k
-            for k in self.vector_store.docstore._dict.keys()
-            if k.startswith(conversation_id + "_")
-        ]
-        docs = self.vector_store.get_by_ids(ids)
-        # Sort by order
-        docs = sorted(
-            [doc for doc in docs if doc is not None],
-            key=lambda d: d.metadata.get("order", 0),
+        docs = self._get_docs(conversation_id, recency)
+        return to_lc_messages(
+            (doc.metadata.get("sender", "human"), doc.page_content) for doc in docs
         )
-        if recency:
-            docs = docs[-6:]
-        lc_messages = []
-        for doc in docs:
-            sender = doc.metadata.get("sender", "human").lower()
-            if sender == "human":
-                lc_messages.append({"role": "human", "content": doc.page_content})
-            elif sender == "ai":
-                lc_messages.append({"role": "ai", "content": doc.page_content})
-            elif sender == "tool":
-                lc_messages.append({"role": "tool", "content": doc.page_content})
-            else:
-                # fallback: treat as human
-                lc_messages.append({"role": "human", "content": doc.page_content})
-        return lc_messages
 
     def count(self) -> int:
         """Return the number of messages stored."""
@@ -151,8 +366,118 @@ class ConversationMemory:
 
     def list_conversation_ids(self) -> list[str]:
         """List all unique conversation IDs stored."""
-        ids = self.vector_store.docstore._dict.keys()
-        return list(set(k.split("_")[0] for k in ids))
+        return self.conversation_index.conversation_ids()
+
+
+class SegmentConversationMemory:
+    """
+    Store conversations in an append-only SegmentLog instead of a pickled FAISS docstore.
+
+    Exposes the same methods as ConversationMemory. Each store_conversation call
+    appends only the new messages and vectors, and opening the store memory-maps
+    the vectors and reads message content on demand.
+    """
+
+    RECENT_MESSAGES = ConversationMemory.RECENT_MESSAGES
+
+    def __init__(
+        self,
+        embedder,
+        index_folder="history_segments",
+        reset_index=False,
+        max_segment_records=1000,
+        compact_threshold=4,
+    ):
+        self.embedder = embedder
+        self.index_folder = index_folder
+        # Optionally reset the index folder
+        check_and_reset_index(self.index_folder, reset_index)
+        manifest = SegmentLog.read_manifest(index_folder)
+        if manifest is None:
+            dim = len(embedder.embed_query("sample text"))
+        else:
+            dim = manifest["dim"]
+        self.log = SegmentLog(
+            index_folder,
+            dim,
+            max_segment_records=max_segment_records,
+            compact_threshold=compact_threshold,
+        )
+        atexit.register(self.close)
+
+    def store_conversation(self, conversation_id: str, messages: list[dict]):
+        """
+        Append messages for a conversation.
+        Each message is a dict: {'sender': 'human'/'ai', 'content': str}
+        """
+        if not messages:
+            return
+        vectors = self.embedder.embed_documents([msg["content"] for msg in messages])
+        start_order = self.log.next_order(conversation_id)
+        records = [
+            {
+                "id": f"{conversation_id}_{start_order + i}",
+                "conversation_id": conversation_id,
+                "sender": msg["sender"],
+                "order": start_order + i,
+                "content": msg["content"],
+            }
+            for i, msg in enumerate(messages)
+        ]
+        self.log.append(records, vectors)
+
+    def _get_messages(self, conversation_id: str, recency: bool = False) -> list[dict]:
+        ids = self.log.conversation_ids(
+            conversation_id, last=self.RECENT_MESSAGES if recency else None
+        )
+        return self.log.read(ids)
+
+    def get_conversation(
+        self, conversation_id: str, recency: bool = False
+    ) -> list[dict]:
+        """
+        Retrieve the conversation as a list of dicts with sender and content, ordered.
+        """
+        return [
+            {"sender": msg["sender"], "content": msg["content"]}
+            for msg in self._get_messages(conversation_id, recency)
+        ]
+
+    def get_conversation_as_lc_messages(
+        self, conversation_id: str, recency: bool = False
+    ) -> list:
+        """
+        Return the conversation as a list of LangChain HumanMessage and AIMessage objects, ordered.
+        """
+        return to_lc_messages(
+            (msg["sender"], msg["content"])
+            for msg in self._get_messages(conversation_id, recency)
+        )
+
+    def similarity_search(self, query: str, k: int = 4) -> list[dict]:
+        """Return the k stored messages most similar to the query."""
+        hits = self.log.search(self.embedder.embed_query(query), k)
+        messages = {msg["id"]: msg for msg in self.log.read([h[0] for h in hits])}
+        return [messages[message_id] for message_id, _ in hits if message_id in messages]
+
+    def count(self) -> int:
+        """Return the number of messages stored."""
+        return len(self.log)
+
+    def list_conversation_ids(self) -> list[str]:
+        """List all unique conversation IDs stored."""
+        return self.log.list_conversations()
+
+    def flush(self) -> None:
+        """Make every appended message durable."""
+        self.log.sync()
+
+    def close(self) -> None:
+        """Wait for compaction to finish and close the segment files."""
+        if getattr(self, "_closed", False):
+            return
+        self._closed = True
+        self.log.close()
 
 
 if __name__ == "__main__":
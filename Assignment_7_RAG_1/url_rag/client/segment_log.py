@@ -0,0 +1,434 @@
+# Append-only segment log for conversation messages and their embedding vectors
+import os
+import json
+import threading
+import numpy as np
+
+
+class SegmentLog:
+    """
+    Append-only on-disk store for messages and their embedding vectors.
+
+    Data lives in numbered segments inside folder:
+      - seg-NNNNNN.log  one JSON line per message (id, conversation, sender, order, content)
+      - seg-NNNNNN.vec  raw float32 vectors, one row per message
+      - seg-NNNNNN.idx  written when a segment is sealed: the message metadata and
+                        the byte range of each line, without the content
+    MANIFEST.json lists the sealed segments and the active one.
+
+    New messages are appended to the active segment, so a write costs only the
+    new data. Opening the store reads the small .idx files of sealed segments
+    and scans only the active segment; vectors are memory-mapped and message
+    content is read from disk on demand. When enough segments have been sealed
+    they are merged into one by a background compaction.
+    """
+
+    MANIFEST = "MANIFEST.json"
+
+    def __init__(
+        self,
+        folder: str,
+        dim: int,
+        max_segment_records: int = 1000,
+        compact_threshold: int = 4,
+        background_compaction: bool = True,
+    ):
+        self.folder = folder
+        self.max_segment_records = max_segment_records
+        self.compact_threshold = compact_threshold
+        self.background_compaction = background_compaction
+        self._lock = threading.RLock()
+        self._compactor = None
+        # message id -> metadata dict (segment, offset, length, row, conversation_id, sender, order)
+        self._records = {}
+        # conversation_id -> message ids in order
+        self._conversations = {}
+        # segment number -> message ids by vector row
+        self._segment_rows = {}
+        # segment number -> memory-mapped vectors of a sealed segment
+        self._vectors = {}
+
+        os.makedirs(folder, exist_ok=True)
+        manifest = self.read_manifest(folder)
+        if manifest is None:
+            manifest = {"dim": dim, "sealed": [], "active": 0, "next_segment": 1}
+        elif dim is not None and manifest["dim"] != dim:
+            raise ValueError(
+                f"Segment log in '{folder}' stores {manifest['dim']}-d vectors, got {dim}"
+            )
+        self.dim = manifest["dim"]
+        self._sealed = list(manifest["sealed"])
+        self._active = manifest["active"]
+        self._next_segment = manifest["next_segment"]
+
+        self._remove_orphans()
+        for segment in self._sealed:
+            self._load_sealed(segment)
+        self._open_active()
+        for ids in self._conversations.values():
+            ids.sort(key=lambda message_id: self._records[message_id]["order"])
+        self._write_manifest()
+
+    # ------------------------------------------------------------------ paths
+
+    def _path(self, segment: int, suffix: str) -> str:
+        return os.path.join(self.folder, f"seg-{segment:06d}.{suffix}")
+
+    @classmethod
+    def read_manifest(cls, folder: str):
+        """Return the manifest of the store in folder, or None if there is none."""
+        path = os.path.join(folder, cls.MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "dim": self.dim,
+            "sealed": self._sealed,
+            "active": self._active,
+            "next_segment": self._next_segment,
+        }
+        _atomic_write_json(os.path.join(self.folder, self.MANIFEST), manifest)
+
+    def _remove_orphans(self) -> None:
+        """Delete segment files not referenced by the manifest, e.g. an interrupted compaction."""
+        live = set(self._sealed) | {self._active}
+        for file_name in os.listdir(self.folder):
+            if not file_name.startswith("seg-"):
+                continue
+            segment = file_name[4:10]
+            if segment.isdigit() and int(segment) not in live:
+                os.remove(os.path.join(self.folder, file_name))
+
+    # ---------------------------------------------------------------- loading
+
+    def _index_record(self, record: dict) -> None:
+        self._records[record["id"]] = record
+        self._conversations.setdefault(record["conversation_id"], []).append(
+            record["id"]
+        )
+        rows = self._segment_rows.setdefault(record["segment"], [])
+        rows.append(record["id"])
+
+    def _load_sealed(self, segment: int) -> None:
+        with open(self._path(segment, "idx"), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        for record in records:
+            record["segment"] = segment
+            self._index_record(record)
+
+    def _open_active(self) -> None:
+        """Scan the active segment, dropping any partially written tail."""
+        log_path = self._path(self._active, "log")
+        vec_path = self._path(self._active, "vec")
+        offset = 0
+        rows = 0
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    self._index_record(
+                        {
+                            "id": data["id"],
+                            "conversation_id": data["conversation_id"],
+                            "sender": data["sender"],
+                            "order": data["order"],
+                            "segment": self._active,
+                            "offset": offset,
+                            "length": len(line),
+                            "row": data["row"],
+                        }
+                    )
+                    offset += len(line)
+                    rows += 1
+            # Truncate a torn trailing line left by a crash
+            if os.path.getsize(log_path) != offset:
+                os.truncate(log_path, offset)
+        row_bytes = self.dim * 4
+        if os.path.exists(vec_path) and os.path.getsize(vec_path) != rows * row_bytes:
+            os.truncate(vec_path, rows * row_bytes)
+
+        self._active_log = open(log_path, "ab")
+        self._active_vec = open(vec_path, "ab")
+        self._active_size = offset
+        self._active_rows = rows
+
+    # ---------------------------------------------------------------- writing
+
+    def append(self, records: list[dict], vectors) -> None:
+        """
+        Append messages and their vectors to the active segment.
+
+        Args:
+            records: Dicts with id, conversation_id, sender, order and content
+            vectors: Array-like of shape (len(records), dim)
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(records), self.dim):
+            raise ValueError(
+                f"Expected vectors of shape {(len(records), self.dim)}, got {vectors.shape}"
+            )
+        with self._lock:
+            # Vectors first: a log line is only valid once its vector row exists
+            self._active_vec.write(vectors.tobytes())
+            self._active_vec.flush()
+            for record in records:
+                line = (
+                    json.dumps(
+                        {
+                            "id": record["id"],
+                            "conversation_id": record["conversation_id"],
+                            "sender": record["sender"],
+                            "order": record["order"],
+                            "row": self._active_rows,
+                            "content": record["content"],
+                        }
+                    )
+                    + "\n"
+                ).encode("utf-8")
+                self._active_log.write(line)
+                self._index_record(
+                    {
+                        "id": record["id"],
+                        "conversation_id": record["conversation_id"],
+                        "sender": record["sender"],
+                        "order": record["order"],
+                        "segment": self._active,
+                        "offset": self._active_size,
+                        "length": len(line),
+                        "row": self._active_rows,
+                    }
+                )
+                self._active_size += len(line)
+                self._active_rows += 1
+            self._active_log.flush()
+
+            if self._active_rows >= self.max_segment_records:
+                self._seal_active()
+
+    def _seal_active(self) -> None:
+        """Make the active segment immutable and start a new one."""
+        self.sync()
+        self._active_log.close()
+        self._active_vec.close()
+
+        segment = self._active
+        records = [
+            {k: v for k, v in self._records[message_id].items() if k != "segment"}
+            for message_id in self._segment_rows.get(segment, [])
+        ]
+        _atomic_write_json(self._path(segment, "idx"), records)
+
+        self._sealed.append(segment)
+        self._active = self._next_segment
+        self._next_segment += 1
+        self._write_manifest()
+        self._open_active()
+
+        if len(self._sealed) >= self.compact_threshold:
+            if self.background_compaction:
+                if self._compactor is None or not self._compactor.is_alive():
+                    self._compactor = threading.Thread(
+                        target=self.compact, name="segment-compactor", daemon=True
+                    )
+                    self._compactor.start()
+            else:
+                self.compact()
+
+    def sync(self) -> None:
+        """Flush and fsync the active segment."""
+        with self._lock:
+            for f in (self._active_vec, self._active_log):
+                f.flush()
+                os.fsync(f.fileno())
+
+    def compact(self) -> None:
+        """Merge all currently sealed segments into a single sealed segment."""
+        with self._lock:
+            segments = list(self._sealed)
+            if len(segments) < 2:
+                return
+            merged = self._next_segment
+            self._next_segment += 1
+            sources = {s: list(self._segment_rows.get(s, [])) for s in segments}
+            source_records = {
+                message_id: dict(self._records[message_id])
+                for ids in sources.values()
+                for message_id in ids
+            }
+
+        # Sealed segments are immutable, so they can be read without the lock
+        merged_records = []
+        offset = 0
+        with open(self._path(merged, "log"), "wb") as log_out, open(
+            self._path(merged, "vec"), "wb"
+        ) as vec_out:
+            for segment in segments:
+                vectors = self._segment_vectors(segment)
+                with open(self._path(segment, "log"), "rb") as log_in:
+                    for message_id in sources[segment]:
+                        record = source_records[message_id]
+                        log_in.seek(record["offset"])
+                        data = json.loads(log_in.read(record["length"]))
+                        data["row"] = len(merged_records)
+                        line = (json.dumps(data) + "\n").encode("utf-8")
+                        log_out.write(line)
+                        vec_out.write(
+                            np.ascontiguousarray(vectors[record["row"]]).tobytes()
+                        )
+                        merged_records.append(
+                            {
+                                "id": message_id,
+                                "conversation_id": record["conversation_id"],
+                                "sender": record["sender"],
+                                "order": record["order"],
+                                "offset": offset,
+                                "length": len(line),
+                                "row": data["row"],
+                            }
+                        )
+                        offset += len(line)
+            for f in (log_out, vec_out):
+                f.flush()
+                os.fsync(f.fileno())
+        _atomic_write_json(self._path(merged, "idx"), merged_records)
+
+        with self._lock:
+            for record in merged_records:
+                self._records[record["id"]].update(
+                    segment=merged,
+                    offset=record["offset"],
+                    length=record["length"],
+                    row=record["row"],
+                )
+            self._segment_rows[merged] = [r["id"] for r in merged_records]
+            for segment in segments:
+                self._segment_rows.pop(segment, None)
+                self._vectors.pop(segment, None)
+            self._sealed = [merged] + [s for s in self._sealed if s not in segments]
+            self._write_manifest()
+            for segment in segments:
+                for suffix in ("log", "vec", "idx"):
+                    os.remove(self._path(segment, suffix))
+
+    def close(self) -> None:
+        """Wait for a running compaction and close the active segment."""
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self.sync()
+            self._active_log.close()
+            self._active_vec.close()
+
+    # ---------------------------------------------------------------- reading
+
+    def _segment_vectors(self, segment: int) -> np.ndarray:
+        """Return the vectors of a segment as a read-only memory map."""
+        if segment == self._active:
+            rows = self._active_rows
+        else:
+            cached = self._vectors.get(segment)
+            if cached is not None:
+                return cached
+            rows = len(self._segment_rows.get(segment, []))
+        if rows == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        vectors = np.memmap(
+            self._path(segment, "vec"), dtype=np.float32, mode="r", shape=(rows, self.dim)
+        )
+        if segment != self._active:
+            self._vectors[segment] = vectors
+        return vectors
+
+    def read(self, message_ids: list[str]) -> list[dict]:
+        """Read the stored messages for the given ids, skipping unknown ids."""
+        messages = []
+        with self._lock:
+            handles = {}
+            try:
+                for message_id in message_ids:
+                    record = self._records.get(message_id)
+                    if record is None:
+                        continue
+                    segment = record["segment"]
+                    if segment not in handles:
+                        handles[segment] = open(self._path(segment, "log"), "rb")
+                    f = handles[segment]
+                    f.seek(record["offset"])
+                    data = json.loads(f.read(record["length"]))
+                    messages.append(
+                        {
+                            "id": message_id,
+                            "conversation_id": data["conversation_id"],
+                            "sender": data["sender"],
+                            "order": data["order"],
+                            "content": data["content"],
+                        }
+                    )
+            finally:
+                for f in handles.values():
+                    f.close()
+        return messages
+
+    def conversation_ids(self, conversation_id: str, last: int = None) -> list[str]:
+        """Return the ordered message ids of a conversation, optionally only the last few."""
+        with self._lock:
+            ids = self._conversations.get(conversation_id, [])
+            return ids[-last:] if last else list(ids)
+
+    def next_order(self, conversation_id: str) -> int:
+        """Return the order number for the next message of a conversation."""
+        with self._lock:
+            ids = self._conversations.get(conversation_id)
+            if not ids:
+                return 0
+            return self._records[ids[-1]]["order"] + 1
+
+    def list_conversations(self) -> list[str]:
+        with self._lock:
+            return list(self._conversations.keys())
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def search(self, query_vector, k: int = 4) -> list[tuple[str, float]]:
+        """
+        Return the k stored messages closest to query_vector by L2 distance.
+
+        Returns:
+            List of (message id, squared L2 distance), closest first
+        """
+        if k < 1:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        candidates = []
+        with self._lock:
+            segments = self._sealed + [self._active]
+            for segment in segments:
+                vectors = self._segment_vectors(segment)
+                if not len(vectors):
+                    continue
+                distances = ((vectors - query) ** 2).sum(axis=1)
+                top = min(k, len(distances))
+                best = np.argpartition(distances, top - 1)[:top]
+                rows = self._segment_rows[segment]
+                candidates.extend((rows[i], float(distances[i])) for i in best)
+        candidates.sort(key=lambda c: c[1])
+        return candidates[:k]
+
+
+def _atomic_write_json(path: str, data) -> None:
+    """Write JSON to a temp file, fsync it and rename it over path."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,171 @@
+# Session pool - keeps warm MCP server sessions alive across queries
+import sys
+import os
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, List, Optional
+
+# Add the parent directory (eag_agentic_rag) to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "../.."))
+sys.path.append(project_root)
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+from url_rag.client.utils import log
+
+
+class MCPConnection:
+    """
+    A single stdio connection to the MCP server with its initialized session
+    and the LangChain tools loaded from it.
+
+    The tools are bound to the session they were loaded from, so they are
+    cached per connection and reloaded whenever the connection is restarted.
+    """
+
+    def __init__(self, server_params: StdioServerParameters, name: str):
+        self.server_params = server_params
+        self.name = name
+        self.session: Optional[ClientSession] = None
+        self.tools: List[Any] = []
+        self.healthy = False
+        self.restarts = 0
+        self._exit_stack: Optional[AsyncExitStack] = None
+
+    async def start(self) -> None:
+        """Spawn the server process, initialize the session and load the tools."""
+        self._exit_stack = AsyncExitStack()
+        try:
+            read, write = await self._exit_stack.enter_async_context(
+                stdio_client(self.server_params)
+            )
+            self.session = await self._exit_stack.enter_async_context(
+                ClientSession(read, write)
+            )
+            await self.session.initialize()
+            self.tools = await load_mcp_tools(self.session)
+        except BaseException:
+            await self.close()
+            raise
+        self.healthy = True
+        log(f"[{self.name}] Session initialized with {len(self.tools)} tools")
+
+    async def close(self) -> None:
+        """Close the session and terminate the server process."""
+        self.healthy = False
+        exit_stack, self._exit_stack = self._exit_stack, None
+        self.session = None
+        self.tools = []
+        if exit_stack is not None:
+            try:
+                await exit_stack.aclose()
+            except Exception as e:
+                log(f"[{self.name}] Error while closing session: {e}")
+
+    async def restart(self) -> None:
+        """Replace a crashed or unhealthy server with a fresh one."""
+        log(f"[{self.name}] Restarting MCP server")
+        await self.close()
+        self.restarts += 1
+        await self.start()
+
+    async def is_alive(self) -> bool:
+        """Check that the server still answers a ping."""
+        if not self.healthy or self.session is None:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=5)
+            return True
+        except Exception as e:
+            log(f"[{self.name}] Health check failed: {e}")
+            return False
+
+
+class MCPSessionPool:
+    """
+    Pool of long-lived MCP sessions to the url_rag server.
+
+    Sessions are started once and handed out per query, which removes the
+    interpreter start-up, imports, session initialization and tool loading
+    from every query. A session whose server has died is restarted before it
+    is handed out again.
+
+    The pool must be entered and exited from the same task, because the stdio
+    transport is built on anyio cancel scopes.
+    """
+
+    def __init__(
+        self,
+        server_params: StdioServerParameters,
+        size: int = 1,
+        health_check: bool = True,
+    ):
+        if size < 1:
+            raise ValueError("Session pool size must be at least 1")
+        self.server_params = server_params
+        self.size = size
+        self.health_check = health_check
+        self._connections = [
+            MCPConnection(server_params, name=f"mcp-{i}") for i in range(size)
+        ]
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def start(self) -> None:
+        """Start every connection in the pool."""
+        self._idle = asyncio.Queue()
+        for connection in self._connections:
+            await connection.start()
+            self._idle.put_nowait(connection)
+        log(f"MCP session pool started with {self.size} session(s)")
+
+    async def close(self) -> None:
+        """Close every connection in the pool."""
+        # Close in reverse order so the exit stacks unwind like nested contexts
+        for connection in reversed(self._connections):
+            await connection.close()
+        self._idle = None
+        log("MCP session pool closed")
+
+    async def __aenter__(self) -> "MCPSessionPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Borrow a warm session for the duration of one query.
+
+        Yields:
+            Tuple of (ClientSession, cached list of LangChain tools)
+        """
+        if self._idle is None:
+            raise RuntimeError("Session pool has not been started")
+
+        connection = await self._idle.get()
+        try:
+            if not connection.healthy or (
+                self.health_check and not await connection.is_alive()
+            ):
+                await connection.restart()
+            try:
+                yield connection.session, connection.tools
+            except (ConnectionError, EOFError, BrokenPipeError, OSError):
+                # The server went away mid-query; restart it on next use
+                connection.healthy = False
+                raise
+        finally:
+            self._idle.put_nowait(connection)
+
+    def stats(self) -> dict:
+        """Return the number of sessions and how often each was restarted."""
+        return {
+            "size": self.size,
+            "restarts": {c.name: c.restarts for c in self._connections},
+            "healthy": sum(1 for c in self._connections if c.healthy),
+        }
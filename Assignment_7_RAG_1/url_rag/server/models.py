@@ -145,6 +145,21 @@ class RetrieveDocumentsInput(BaseModel):
     k: int = Field(3, description="The number of documents to retrieve (default: 3)")
 
 
+class BatchRetrieveDocumentsInput(BaseModel):
+    """Input schema for the 'batch_retrieve_documents' operation."""
+
+    queries: List[str] = Field(..., description="The search query strings")
+    k: int = Field(3, description="The number of documents to retrieve per query (default: 3)")
+
+    @field_validator("queries")
+    @classmethod
+    def queries_cannot_be_empty(cls, v):
+        """Validate that at least one query is given."""
+        if not v:
+            raise ValueError("At least one query is required")
+        return v
+
+
 class Document(BaseModel):
     """A document retrieved from the vector store."""
 
@@ -17,10 +17,16 @@ if "SSL_CERT_FILE" in os.environ:
 
 # Import after path setup
 from mcp.server.fastmcp import FastMCP
-from tools import get_retrieved_docs, open_urls
+from tools import (
+    get_retrieved_docs,
+    get_retrieved_docs_batch,
+    open_urls,
+    vector_store_cache,
+)
 from loguru import logger
 from models import (
     RetrieveDocumentsInput,
+    BatchRetrieveDocumentsInput,
 )
 
 # Set the server name
@@ -58,6 +64,45 @@ def web_search_tool(input_data: RetrieveDocumentsInput) -> str:
         raise ValueError(f"Error retrieving documents: {e}")
 
 
+@mcp.tool()
+def batch_web_search_tool(input_data: BatchRetrieveDocumentsInput) -> str:
+    """Retrieve documents for several queries at once using vector search.
+
+    All queries are embedded in one call and searched in one FAISS search.
+    Unlike web_search_tool, the retrieved URLs are not opened in the browser.
+
+    Args:
+        input_data: The BatchRetrieveDocumentsInput model containing the queries and k value
+
+    Returns:
+        A JSON string containing one {query, urls, contents, count} entry per query
+    """
+    try:
+        batch_results = get_retrieved_docs_batch(input_data.queries, input_data.k)
+        results = [
+            {
+                "query": query,
+                "urls": web_urls,
+                "contents": page_contents,
+                "count": len(web_urls),
+            }
+            for query, (web_urls, page_contents) in zip(
+                input_data.queries, batch_results
+            )
+        ]
+        response = {"results": results, "count": len(results)}
+        return json.dumps(response, indent=2)
+    except Exception as e:
+        logger.error(f"Error retrieving documents in batch: {e}")
+        raise ValueError(f"Error retrieving documents in batch: {e}")
+
+
+@mcp.resource("stats://vector_store_cache")
+def vector_store_cache_stats() -> str:
+    """Hit/miss/reload counters of the resident vector store cache."""
+    return json.dumps(vector_store_cache.stats(), indent=2)
+
+
 if __name__ == "__main__":
     logger.info(f"Starting MCP server in directory: {os.getcwd()}")
     logger.info(f"Python executable: {sys.executable}")
@@ -1,4 +1,6 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import webbrowser
 
@@ -10,6 +12,8 @@ if "SSL_CERT_FILE" in os.environ:
 from utils import read_yaml_file
 from embedding_provider import OpenAIEmbeddingProvider
 from langchain_community.vectorstores import FAISS
+import faiss
+import numpy as np
 import traceback
 from loguru import logger
 
@@ -43,20 +47,16 @@ index_path = os.path.join("server", index_name)
 print(f"Index path set to: {index_path}")
 
 
-def get_vector_store(index_name=index_name, embedder=embedder):
+def _resolve_index_path(index_name):
     """
-    Load a FAISS vector store from the specified index name.
+    Resolve the folder holding the FAISS index for the given index name.
 
     Args:
-        index_name (str): The name of the index to load.
-        embedder: The embedding provider to use.
+        index_name (str): The name of the index to locate.
 
     Returns:
-        vector_store: The loaded FAISS vector store.
+        path (str): The folder containing index.faiss and index.pkl.
     """
-    if not embedder:
-        raise ValueError("Embedder not initialized")
-
     # Update path to look in the server folder
     # path = f"server/{index_name}"
     path = os.path.join("url_rag", "server", index_name)
@@ -71,16 +71,120 @@ def get_vector_store(index_name=index_name, embedder=embedder):
             raise FileNotFoundError(
                 f"Index folder '{index_name}' does not exist and cannot be loaded."
             )
+    return path
+
+
+class VectorStoreCache:
+    """
+    Process-lifetime cache of loaded FAISS vector stores, one per index name.
+
+    A store is loaded on first use and kept resident. Before each lookup the
+    mtime and size of index.faiss / index.pkl are compared with the values seen
+    at load time, and the store is reloaded when they differ.
+    """
+
+    INDEX_FILES = ("index.faiss", "index.pkl")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stores = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.load_seconds = 0.0
+
+    def _signature(self, path):
+        """Return the (mtime_ns, size) pairs of the index files in path."""
+        signature = []
+        for file_name in self.INDEX_FILES:
+            stat = os.stat(os.path.join(path, file_name))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def get(self, index_name, embedder):
+        """
+        Return the vector store for index_name, loading or reloading it if needed.
+
+        Args:
+            index_name (str): The name of the index to load.
+            embedder: The embedding provider to use.
+
+        Returns:
+            vector_store: The loaded FAISS vector store, or None if loading failed.
+        """
+        path = _resolve_index_path(index_name)
+        signature = self._signature(path)
+
+        with self._lock:
+            cached = self._stores.get(index_name)
+            if cached is not None and cached["signature"] == signature:
+                self.hits += 1
+                return cached["vector_store"]
+
+            if cached is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+                print(f"Index files for '{index_name}' changed, reloading.")
+
+            start = time.perf_counter()
+            vector_store = FAISS.load_local(
+                path, embedder, allow_dangerous_deserialization=True
+            )
+            self.load_seconds += time.perf_counter() - start
+            self._stores[index_name] = {
+                "signature": signature,
+                "vector_store": vector_store,
+            }
+            print(
+                f"Loaded existing FAISS index from {index_name} successfully from {path}."
+            )
+            return vector_store
+
+    def invalidate(self, index_name=None):
+        """Drop one cached store, or all of them when index_name is None."""
+        with self._lock:
+            if index_name is None:
+                self._stores.clear()
+            else:
+                self._stores.pop(index_name, None)
+
+    def stats(self):
+        """Return the hit/miss/reload counters and the time spent loading."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "load_seconds": round(self.load_seconds, 4),
+                "cached_indexes": sorted(self._stores.keys()),
+            }
+
+
+vector_store_cache = VectorStoreCache()
+
+
+def get_vector_store(index_name=index_name, embedder=embedder):
+    """
+    Load a FAISS vector store from the specified index name.
+
+    The store is served from the process-wide vector_store_cache, so the index
+    is only read from disk on the first call or after its files change.
+
+    Args:
+        index_name (str): The name of the index to load.
+        embedder: The embedding provider to use.
+
+    Returns:
+        vector_store: The loaded FAISS vector store.
+    """
+    if not embedder:
+        raise ValueError("Embedder not initialized")
 
     try:
-        # Load existing FAISS index with improved error handling
-        vector_store = FAISS.load_local(
-            path, embedder, allow_dangerous_deserialization=True
-        )
-        print(
-            f"Loaded existing FAISS index from {index_name} successfully from {path}."
-        )
-        return vector_store
+        return vector_store_cache.get(index_name, embedder)
+    except FileNotFoundError:
+        raise
     except Exception as e:
         print(f"Error loading FAISS index: {e}")
         traceback.print_exc()
@@ -142,6 +246,66 @@ def get_retrieved_docs(query: str, k: int = 3) -> tuple[list[str], list[str]]:
         return mock_urls, mock_contents
 
 
+def get_retrieved_docs_batch(
+    queries: list[str], k: int = 3
+) -> list[tuple[list[str], list[str]]]:
+    """
+    Retrieve documents for many queries with one embedding call and one FAISS search.
+
+    Args:
+        queries (list): The query strings to search for.
+        k (int): The number of documents to retrieve per query.
+
+    Returns:
+        results (list): One (web_url, page_content) tuple per query, in query order.
+    """
+    try:
+        vector_store = get_vector_store()
+
+        # If vector_store is None, fall back to the per-query mock results
+        if vector_store is None:
+            return [get_retrieved_docs(query, k) for query in queries]
+
+        # Embed every query in a single request
+        query_matrix = np.array(
+            vector_store.embedding_function.embed_documents(queries), dtype=np.float32
+        )
+        if vector_store._normalize_L2:
+            faiss.normalize_L2(query_matrix)
+
+        # One search over the whole query matrix
+        _, indices = vector_store.index.search(query_matrix, k)
+
+        results = []
+        for row in indices:
+            web_url = []
+            page_content = []
+            for i in row:
+                if i == -1:
+                    continue
+                doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+                if isinstance(doc, str):
+                    # docstore returns an error string for unknown ids
+                    continue
+                web_url.append(doc.metadata.get("url", ""))
+                page_content.append(doc.page_content[:200])
+            results.append((web_url, page_content))
+        return results
+    except Exception as e:
+        logger.error(f"Error retrieving documents in batch: {e}")
+        mock_urls = [f"https://example.com/error-mock-{i}" for i in range(min(k, 3))]
+        return [
+            (
+                mock_urls,
+                [
+                    f"Error encountered when searching for '{query}'. Mock result provided."
+                    for i in range(min(k, 3))
+                ],
+            )
+            for query in queries
+        ]
+
+
 if __name__ == "__main__":
     # Example usage
     try: